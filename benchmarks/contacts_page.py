@@ -0,0 +1,88 @@
+"""
+Cost of loading one page of contacts as ORM objects with the owner joined in (before) and as plain
+rows of the ContactResponse columns (after).
+
+For each variant the report shows the statements sent to the database, the objects left in the
+session's identity map, the peak memory allocated while the page is loaded and the mean time per page.
+
+Usage::
+
+    python -m benchmarks.contacts_page --url sqlite:///bench.db --page 500 --rounds 50
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from src.emtity.models import Base, Contact, Users
+from src.repository.contacts import get_contacts
+
+BENCH_EMAIL = 'bench-page@example.com'
+
+
+def seed(engine, contacts: int) -> Users:
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        user = db.query(Users).filter_by(email=BENCH_EMAIL).first()
+        if user is None:
+            user = Users(username='bench', email=BENCH_EMAIL, password='-' * 60)
+            db.add(user)
+            db.add_all(Contact(first_name=f'First{i}', last_name=f'Last{i}', email=f'c{i}@example.com',
+                               phone_number=str(i), birthday=date(1990, 1, 1) + timedelta(days=i),
+                               user=user) for i in range(contacts))
+            db.commit()
+        return Users(id=user.id)
+
+
+def joined_page(db, user: Users, page: int):
+    stmt = (select(Contact).options(joinedload(Contact.user)).filter_by(user_id=user.id)
+            .order_by(Contact.id).limit(page))
+    return db.execute(stmt).unique().scalars().all()
+
+
+def column_page(db, user: Users, page: int):
+    return get_contacts(page, 0, db, user)
+
+
+def measure(make_session, load, user: Users, page: int, rounds: int, statements: list):
+    with make_session() as db:
+        load(db, user, page)
+    statements.clear()
+    tracemalloc.start()
+    with make_session() as db:
+        page_rows = load(db, user, page)  # noqa: F841 - the identity map only holds weak references
+        tracked = len(db.identity_map)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    count = len(statements)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        with make_session() as db:
+            load(db, user, page)
+    return count, tracked, peak, (time.perf_counter() - started) / rounds
+
+
+def main(args):
+    engine = create_engine(args.url)
+    user = seed(engine, args.page)
+    make_session = sessionmaker(bind=engine)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *_: statements.append(1))
+
+    print(f'{"variant":<16}{"statements":>12}{"tracked":>10}{"peak KiB":>12}{"ms/page":>10}')
+    for name, load in (('joined ORM', joined_page), ('columns', column_page)):
+        count, tracked, peak, elapsed = measure(make_session, load, user, args.page, args.rounds, statements)
+        print(f'{name:<16}{count:>12}{tracked:>10}{peak / 1024:>12.1f}{elapsed * 1000:>10.2f}')
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='sqlite:///bench.db')
+    parser.add_argument('--page', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+Login throughput with bcrypt verification in the request threadpool (before) and in the
+password hashing process pool (after).
+
+While the logins run, a probe keeps submitting no-op jobs to the threadpool the way the sync
+contacts endpoints do, so the report also shows how long the rest of the worker waits for a thread.
+
+Usage::
+
+    BCRYPT_ROUNDS=12 python -m benchmarks.login --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.endpoints import BENCH_ENV, percentile
+
+# config is read when src.conf.config is first imported, so the settings without a default are
+# filled in before any app import; the login path never touches the database
+for name, value in {**BENCH_ENV, 'DB_URL': 'sqlite://'}.items():
+    os.environ.setdefault(name, value)
+
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import config
+from src.services import passwords
+from src.services.auth import auth_service
+
+
+async def probe(stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+
+
+async def run(verify, hashed: str, logins: int, concurrency: int) -> tuple[float, list]:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, latencies = asyncio.Event(), []
+
+    async def one():
+        async with semaphore:
+            assert (await verify('secret1', hashed))[0]
+
+    probe_task = asyncio.create_task(probe(stop, latencies))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return logins / elapsed, latencies
+
+
+async def main(args):
+    hashed = passwords.hash_password('secret1', config.BCRYPT_ROUNDS)
+
+    async def threadpool(password, hashed_password):
+        return await run_in_threadpool(passwords.verify_and_update, password, hashed_password,
+                                       config.BCRYPT_ROUNDS)
+
+    # warm up the worker processes so their start-up is not billed to the first logins
+    await asyncio.gather(*(auth_service.verify_and_update_password('secret1', hashed) for _ in range(4)))
+
+    print(f'{"mode":<14}{"logins/s":>10}{"probe p50 ms":>14}{"probe p99 ms":>14}')
+    for name, verify in (('threadpool', threadpool), ('process pool', auth_service.verify_and_update_password)):
+        rate, latencies = await run(verify, hashed, args.logins, args.concurrency)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = percentile(latencies, 0.99) * 1000
+        print(f'{name:<14}{rate:>10.1f}{p50:>14.2f}{p99:>14.2f}')
+    auth_service.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
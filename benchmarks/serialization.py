@@ -0,0 +1,96 @@
+"""
+Time to turn a page of contacts into a response body: FastAPI's response_model path with the stdlib
+json encoder (before) and one TypeAdapter call per page with pydantic-core / msgpack (after).
+
+Only serialization is timed, the page is loaded once up front.
+
+Usage::
+
+    python -m benchmarks.serialization --contacts 500 --rounds 200
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from benchmarks.endpoints import BENCH_ENV
+
+# config is read when src.conf.config is first imported, so the settings without a default are
+# filled in before any app import; the page is loaded from its own in-memory database
+for name, value in {**BENCH_ENV, 'DB_URL': 'sqlite://'}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import ConfigDict
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from src.emtity.models import Base, Contact, Users
+from src.repository.contacts import get_contacts
+from src.routes.contacts import contacts_adapter
+from src.schemas.contact import ContactBase
+from src.services.serialization import JSON, MSGPACK, dump, records
+
+
+class LegacyContactResponse(ContactBase):
+    # ContactResponse as it was: the email is validated again on every read
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def load(contacts: int):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as db:
+        user = Users(id=1, username='bench', email='bench@example.com', password='-')
+        db.add(user)
+        db.add_all(Contact(first_name=f'First{i}', last_name=f'Last{i}', email=f'c{i}@example.com',
+                           phone_number=str(i), birthday=date(1990, 1, 1) + timedelta(days=i),
+                           user=user) for i in range(contacts))
+        db.commit()
+        objects = db.execute(select(Contact).options(joinedload(Contact.user)).order_by(Contact.id)).unique()\
+            .scalars().all()
+        rows = get_contacts(contacts, 0, db, user)
+    return objects, rows
+
+
+def before(objects) -> bytes:
+    # response_model validation of every ORM object, then jsonable_encoder and json.dumps in JSONResponse
+    contacts = [LegacyContactResponse.model_validate(contact) for contact in objects]
+    content = jsonable_encoder({'contacts': contacts, 'next_cursor': None})
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def after(rows, media_type: str) -> bytes:
+    page = contacts_adapter.validate_python({'contacts': records(rows), 'next_cursor': None})
+    return dump(contacts_adapter, page, media_type)
+
+
+def timed(fn, rounds: int) -> tuple[float, int]:
+    size = len(fn())
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds, size
+
+
+def main(args):
+    objects, rows = load(args.contacts)
+    variants = (
+        ('response_model + json', lambda: before(objects)),
+        ('TypeAdapter json', lambda: after(rows, JSON)),
+        ('TypeAdapter msgpack', lambda: after(rows, MSGPACK)),
+    )
+    print(f'{"path":<24}{"ms/page":>10}{"bytes":>10}')
+    for name, fn in variants:
+        elapsed, size = timed(fn, args.rounds)
+        print(f'{name:<24}{elapsed * 1000:>10.2f}{size:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--contacts', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=200)
+    main(parser.parse_args())
@@ -1,52 +1,103 @@
-from fastapi import FastAPI, HTTPException, Depends
+import contextlib
+import functools
+import logging
+
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
 
-from src.database.db import get_db
+from src.database.db import get_session, sessionmanager
+from src.database.helpers import execute
+from src.database.replicas import read_your_writes
 from src.routes.contacts import router as router_contact
 from src.routes.auth import router as router_auth
+from src.services.auth import auth_service
+from src.services import metrics
+from src.services.cache import response_cache, user_cache
+from src.services.email import email_queue
+from src.services.health import HealthMonitor, tcp_ping
+from src.services.limits import rate_limiter
+from src.services.sessions import session_store
+from src.services.timing import ServerTimingMiddleware
 from src.conf.config import config
 
-app = FastAPI()
-app.include_router(router_auth, prefix='/api')
-app.include_router(router_contact, prefix='/api')
+REDIS_SUBSYSTEMS = (rate_limiter, session_store, read_your_writes, user_cache, response_cache, email_queue)
 
-origins = [
-    "http://localhost:8000"
-]
+PROBE_PATHS = ("/livez", "/readyz")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
+health = HealthMonitor(config.HEALTH_CHECK_INTERVAL, config.HEALTH_CHECK_TIMEOUT, config.HEALTH_REQUIRED)
 
 
-@app.on_event("startup")
-async def startup():
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are needed by your app,
-    such as connecting to databases or initializing caches.
+    The lifespan function connects the subsystems that need Redis and starts the background dependency
+    checks when the application starts up, and releases everything the worker holds when it stops:
+    the checks, the Redis client, the database engines (which are only created by the first session),
+    the password hashing processes and, in multiprocess metrics mode, the gauges of this worker.
 
-    :return: A fastapilimiter object
-    :doc-author: Trelent
+    :param app: FastAPI: The application
+    :return: None
+    """
+    # the client connects on its first command, so starting up waits for nothing
+    r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0, password=None)
+    for subsystem in REDIS_SUBSYSTEMS:
+        subsystem.redis = r
+    health.start({
+        "database": functools.partial(sessionmanager.ping, config.HEALTH_CHECK_TIMEOUT),
+        "redis": r.ping,
+        "smtp": functools.partial(tcp_ping, config.MAIL_SERVER, config.MAIL_PORT),
+    })
+    try:
+        yield
+    finally:
+        await health.stop()
+        for subsystem in REDIS_SUBSYSTEMS:
+            subsystem.redis = None
+        await r.aclose()
+        await sessionmanager.close()
+        auth_service.shutdown()
+        metrics.shutdown()
+
+
+def create_app() -> FastAPI:
+    """
+    The create_app function builds the application: routers, middleware and the lifespan handler.
+    Nothing is connected until the lifespan starts, so building an app is cheap and side-effect free.
+
+    :return: The application
     """
-    r = await redis.Redis(
-            host=config.REDIS_HOST,
-            port=config.REDIS_PORT,
-            db=0,
-            password=None,
-        )
-    await FastAPILimiter.init(r)
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.include_router(router_auth, prefix='/api')
+    app.include_router(router_contact, prefix='/api')
+    app.include_router(router)
 
+    origins = [
+        "http://localhost:8000"
+    ]
 
-@app.get("/")
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing", "X-Profile"],
+    )
+    app.add_middleware(metrics.MetricsMiddleware)
+    # Added last so it wraps everything else, CORS included
+    app.add_middleware(ServerTimingMiddleware, profile_dir=config.PROFILE_DIR if config.PROFILE_REQUESTS else None,
+                       skip_paths=PROBE_PATHS)
+    return app
+
+
+@router.get("/")
 def read_root():
     """
     The read_root function returns a dictionary with the key &quot;Hello&quot; and value &quot;World&quot;.
@@ -58,8 +109,57 @@ def read_root():
     return {"Hello": "World"}
 
 
-@app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """
+    The prometheus_metrics function exposes the metrics of all workers in the Prometheus text format:
+    request latency and status counts per route, database pool usage, rate limiter rejections
+    and email delivery outcomes.
+
+    :return: The metrics in the Prometheus exposition format
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/livez", include_in_schema=False)
+async def livez():
+    """
+    The livez function is the liveness probe: answering at all shows the worker is not stuck.
+    It checks no dependency, an outage of the database should not get every worker restarted, and runs
+    on the event loop rather than in the threadpool, which busy routes can fill.
+
+    :return: A dict with the status
+    """
+    return {"status": "ok"}
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    The readyz function is the readiness probe. It reports the outcome of the last background check of
+    the database, Redis and the mail server, and answers 503 while a required one is down or the checks
+    have stalled. It opens no connection, so probing it often costs nothing.
+
+    :return: The status of every dependency, with 503 when the worker is not ready
+    """
+    return ORJSONResponse(health.snapshot(), status_code=200 if health.ready else 503)
+
+
+@router.get("/api/healthchecker/pool")
+def pool_stats():
+    """
+    The pool_stats function reports the state of the database connection pool:
+    connections checked out and in overflow, checkout timeouts and a cumulative histogram
+    of the time requests waited for a connection. The pools of read replicas are listed under replicas.
+
+    :return: A dict with the pool statistics
+    """
+    return sessionmanager.pool_stats()
+
+
+@router.get("/api/healthchecker")
+async def healthchecker(db: AsyncSession | Session = Depends(get_session)):
 
     """
     The healthchecker function is a simple function that checks the health of the database.
@@ -72,10 +172,19 @@ def healthchecker(db: Session = Depends(get_db)):
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await execute(db, text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+
+
+def __getattr__(name: str):
+    # ``uvicorn main:app`` keeps working; ``uvicorn --factory main:create_app`` is the same without the global
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,37 @@
+"""add user directory
+
+Revision ID: a6e2b9c4d718
+Revises: f4c1d9a7b253
+Create Date: 2026-10-18 01:04:52.671238
+
+The directory maps emails to user ids on the primary and allocates the ids of new users, which decide
+their shard. It is filled with the existing users, who all live on the primary. Shards are migrated
+like the primary (``DB_URL=<shard url> alembic upgrade head``); their copy of the table stays empty.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6e2b9c4d718'
+down_revision: Union[str, None] = 'f4c1d9a7b253'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_directory',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('email', sa.String(length=150), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.execute('INSERT INTO user_directory (id, email) SELECT id, email FROM users')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("SELECT setval('user_directory_id_seq', (SELECT coalesce(max(id), 0) + 1 FROM user_directory), false)")
+
+
+def downgrade() -> None:
+    op.drop_table('user_directory')
@@ -0,0 +1,46 @@
+"""add contacts search indexes
+
+Revision ID: b41d7e9a0c25
+Revises: 8f3b2c6d1e47
+Create Date: 2026-10-17 21:24:50.117342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.emtity.models import CONTACTS_FTS_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41d7e9a0c25'
+down_revision: Union[str, None] = '8f3b2c6d1e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ('first_name', 'last_name', 'email')
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name in TRGM_COLUMNS:
+            op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                            postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for statement in CONTACTS_FTS_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name in TRGM_COLUMNS:
+            op.drop_index(f'ix_contacts_{name}_trgm', table_name='contacts')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS contacts_fts')
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS contacts_fts_{suffix}')
@@ -0,0 +1,34 @@
+"""add contacts birthday_md
+
+Revision ID: c7a5f1e3b982
+Revises: b41d7e9a0c25
+Create Date: 2026-10-17 21:48:03.550871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a5f1e3b982'
+down_revision: Union[str, None] = 'b41d7e9a0c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE contacts SET birthday_md = CAST(strftime('%m%d', birthday) AS INTEGER) "
+                   "WHERE birthday IS NOT NULL")
+    else:
+        op.execute("UPDATE contacts SET birthday_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) "
+                   "WHERE birthday IS NOT NULL")
+    op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
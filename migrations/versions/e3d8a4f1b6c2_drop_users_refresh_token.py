@@ -0,0 +1,27 @@
+"""drop users refresh_token
+
+Revision ID: e3d8a4f1b6c2
+Revises: c7a5f1e3b982
+Create Date: 2026-10-17 23:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3d8a4f1b6c2'
+down_revision: Union[str, None] = 'c7a5f1e3b982'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # refresh-token sessions live in Redis now
+    op.drop_column('users', 'refresh_token')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('refresh_token', sa.String(length=255), nullable=True))
@@ -0,0 +1,180 @@
+"""partition contacts by user_id
+
+Revision ID: f4c1d9a7b253
+Revises: e3d8a4f1b6c2
+Create Date: 2026-10-18 00:21:07.530915
+
+On Postgres the contacts table is rebuilt as a hash-partitioned table while the application keeps
+serving traffic:
+
+1. ``contacts_partitioned`` is created next to ``contacts`` with its partitions and indexes, and a
+   trigger on ``contacts`` mirrors every insert, update and delete into it from then on. The trigger also
+   logs the key of every deleted row to ``contacts_deleted``;
+2. the ``contacts_backfill`` procedure copies the existing rows in id ranges, committing after each
+   batch, so no long transaction or table lock is held (it runs in an autocommit block and can also be
+   started by hand beforehand with ``CALL contacts_backfill(10000)``: the migration then only copies
+   what is left);
+3. a row deleted while its batch was being copied is brought back by the batch. The
+   ``contacts_reconcile`` procedure removes those rows, going through the logged deletes in batches and
+   committing after each one;
+4. under a short exclusive lock the deletes logged since then are reconciled, the tables are swapped
+   and the old one is dropped. Nothing under the lock scans the table: the copy is analyzed beforehand.
+
+Every row is in the copy without a second pass over ``contacts``. Creating the trigger waits for the
+transactions that write ``contacts``, so a row is either committed before the backfill starts, which
+copies it, or written through the trigger.
+
+Contacts without an owner cannot be reached through the API and are not carried over: the partition
+key is NOT NULL.
+
+SQLite has no declarative partitioning: it keeps the plain table, which is what the tests run on.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.emtity.models import CONTACTS_PARTITIONS, contacts_partitions_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1d9a7b253'
+down_revision: Union[str, None] = 'e3d8a4f1b6c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 10000
+TRGM_COLUMNS = ('first_name', 'last_name', 'email')
+COLUMNS = ('first_name', 'last_name', 'email', 'phone_number', 'birthday', 'birthday_md', 'created_at',
+           'updated_at', 'additional_data')
+INDEXES = [('ix_contacts_user_id_birthday_md', '(user_id, birthday_md)')] + [
+    (f'ix_contacts_{name}_trgm', f'USING gin ({name} gin_trgm_ops)') for name in TRGM_COLUMNS
+]
+
+# a logged row is only dropped from the copy if it is still gone: its key may have been written again since
+RECONCILE = ("p.user_id = d.user_id AND p.id = d.id "
+             "AND NOT EXISTS (SELECT 1 FROM contacts c WHERE c.id = d.id AND c.user_id = d.user_id)")
+
+PREPARE = [
+    "CREATE TABLE contacts_partitioned (LIKE contacts INCLUDING DEFAULTS) PARTITION BY HASH (user_id)",
+    "ALTER TABLE contacts_partitioned ALTER COLUMN user_id SET NOT NULL",
+    "ALTER TABLE contacts_partitioned ADD CONSTRAINT contacts_partitioned_user_id_fkey "
+    "FOREIGN KEY (user_id) REFERENCES users (id)",
+    *contacts_partitions_ddl('contacts_partitioned'),
+    *[f"CREATE INDEX {name.replace('ix_contacts_', 'ix_contacts_partitioned_')} ON contacts_partitioned {spec}"
+      for name, spec in INDEXES],
+    "CREATE TABLE contacts_deleted (user_id integer NOT NULL, id integer NOT NULL, PRIMARY KEY (user_id, id))",
+    # an upsert rather than DO NOTHING: a row the backfill has just copied but not yet committed is
+    # overwritten with the newer version once the backfill batch commits
+    f"""
+    CREATE FUNCTION contacts_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND (OLD.user_id, OLD.id) IS DISTINCT FROM (NEW.user_id, NEW.id)) THEN
+            DELETE FROM contacts_partitioned WHERE user_id = OLD.user_id AND id = OLD.id;
+            IF OLD.user_id IS NOT NULL THEN
+                INSERT INTO contacts_deleted VALUES (OLD.user_id, OLD.id) ON CONFLICT DO NOTHING;
+            END IF;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW.user_id IS NOT NULL THEN
+            INSERT INTO contacts_partitioned SELECT (NEW).*
+                ON CONFLICT (user_id, id) DO UPDATE SET {', '.join(f'{name} = EXCLUDED.{name}' for name in COLUMNS)};
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "CREATE TRIGGER contacts_mirror AFTER INSERT OR UPDATE OR DELETE ON contacts "
+    "FOR EACH ROW EXECUTE FUNCTION contacts_mirror()",
+    """
+    CREATE PROCEDURE contacts_backfill(batch_size integer) LANGUAGE plpgsql AS $$
+    DECLARE
+        last_id integer := 0;
+        max_id integer;
+    BEGIN
+        SELECT coalesce(max(id), 0) INTO max_id FROM contacts;
+        WHILE last_id < max_id LOOP
+            INSERT INTO contacts_partitioned
+                SELECT * FROM contacts
+                WHERE id > last_id AND id <= last_id + batch_size AND user_id IS NOT NULL
+                ON CONFLICT (user_id, id) DO NOTHING;
+            last_id := last_id + batch_size;
+            COMMIT;
+        END LOOP;
+    END
+    $$
+    """,
+    f"""
+    CREATE PROCEDURE contacts_reconcile(batch_size integer) LANGUAGE plpgsql AS $$
+    DECLARE
+        user_ids integer[];
+        ids integer[];
+    BEGIN
+        LOOP
+            WITH batch AS (
+                DELETE FROM contacts_deleted
+                WHERE ctid IN (SELECT ctid FROM contacts_deleted LIMIT batch_size)
+                RETURNING user_id, id
+            )
+            SELECT array_agg(user_id), array_agg(id) INTO user_ids, ids FROM batch;
+            EXIT WHEN user_ids IS NULL;
+            DELETE FROM contacts_partitioned p USING unnest(user_ids, ids) AS d (user_id, id)
+                WHERE {RECONCILE};
+            COMMIT;
+        END LOOP;
+    END
+    $$
+    """,
+]
+
+SWAP = [
+    "LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE",
+    # only the deletes logged since contacts_reconcile went through the log
+    f"DELETE FROM contacts_partitioned p USING contacts_deleted d WHERE {RECONCILE}",
+    "DROP TRIGGER contacts_mirror ON contacts",
+    "DROP FUNCTION contacts_mirror()",
+    "DROP PROCEDURE contacts_backfill(integer)",
+    "DROP PROCEDURE contacts_reconcile(integer)",
+    "DROP TABLE contacts_deleted",
+    # the sequence is owned by contacts.id and would be dropped with the old table
+    "ALTER SEQUENCE contacts_id_seq OWNED BY contacts_partitioned.id",
+    "DROP TABLE contacts",
+    "ALTER TABLE contacts_partitioned RENAME TO contacts",
+    "ALTER TABLE contacts RENAME CONSTRAINT contacts_partitioned_pkey TO contacts_pkey",
+    "ALTER TABLE contacts RENAME CONSTRAINT contacts_partitioned_user_id_fkey TO contacts_user_id_fkey",
+    *[f"ALTER INDEX {name.replace('ix_contacts_', 'ix_contacts_partitioned_')} RENAME TO {name}"
+      for name, _ in INDEXES],
+    *[f"ALTER TABLE contacts_partitioned_p{remainder} RENAME TO contacts_p{remainder}"
+      for remainder in range(CONTACTS_PARTITIONS)],
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for statement in PREPARE:
+        op.execute(statement)
+    with op.get_context().autocommit_block():
+        op.execute(f'CALL contacts_backfill({BACKFILL_BATCH})')
+        op.execute(f'CALL contacts_reconcile({BACKFILL_BATCH})')
+        # before the lock rather than under it: the statistics stay with the table when it is renamed
+        op.execute('ANALYZE contacts_partitioned')
+    for statement in SWAP:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE TABLE contacts_plain (LIKE contacts INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE contacts_plain ALTER COLUMN user_id DROP NOT NULL")
+    op.execute("INSERT INTO contacts_plain SELECT * FROM contacts")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts_plain.id")
+    op.execute("DROP TABLE contacts")
+    op.execute("ALTER TABLE contacts_plain RENAME TO contacts")
+    op.create_primary_key('contacts_pkey', 'contacts', ['id'])
+    op.create_foreign_key('contacts_user_id_fkey', 'contacts', 'users', ['user_id'], ['id'])
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False)
+    for name in TRGM_COLUMNS:
+        op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                        postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'})
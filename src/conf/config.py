@@ -4,17 +4,79 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DB_URL: str
+    DB_ASYNC: bool = False
+    DB_ASYNC_URL: str | None = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_ASYNC_URLS: list[str] = []
+    DB_READ_YOUR_WRITES_SECONDS: float = 5
+    DB_SHARD_URLS: list[str] = []
+    DB_SHARD_ASYNC_URLS: list[str] = []
     SECRET_KEY_JWT: str
     ALGORITHM: str
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
     MAIL_FROM: str
     MAIL_PORT: int
     MAIL_SERVER: str
+    MAIL_SSL_TLS: bool = True
+    MAIL_STARTTLS: bool = False
+    MAIL_USE_CREDENTIALS: bool = True
+    EMAIL_WORKERS: int = 4
+    EMAIL_BATCH_SIZE: int = 20
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BACKOFF: float = 10
     REDIS_HOST: str
     REDIS_PORT: int
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_LOCAL_TTL: float = 30
+    USER_CACHE_REDIS_TTL: int = 900
+    BULK_IMPORT_CHUNK_SIZE: int = 1000
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    EXPORT_BATCH_SIZE: int = 1000
+    RESPONSE_CACHE_TTL: int = 300
+    RATE_LIMITS: dict[str, str] = {}
+    RATE_LIMIT_FAIL_OPEN: bool = True
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.05
+    RATE_LIMIT_BREAKER_FAILURES: int = 5
+    RATE_LIMIT_BREAKER_RESET: float = 30
+    HEALTH_CHECK_INTERVAL: float = 10
+    HEALTH_CHECK_TIMEOUT: float = 2
+    HEALTH_REQUIRED: list[str] = ['database']
+    LOG_LEVEL: str = 'INFO'
+    PROFILE_REQUESTS: bool = False
+    PROFILE_DIR: str = 'profiles'
 
     model_config = ConfigDict(env_file='.env', env_file_encoding='utf-8')  # noqa
 
+    @staticmethod
+    def _asyncpg_url(url: str) -> str:
+        return url.replace('postgresql+psycopg2://', 'postgresql+asyncpg://', 1) \
+            .replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+    @property
+    def async_db_url(self) -> str:
+        if self.DB_ASYNC_URL:
+            return self.DB_ASYNC_URL
+        return self._asyncpg_url(self.DB_URL)
+
+    @property
+    def async_replica_urls(self) -> list[str]:
+        if self.DB_REPLICA_ASYNC_URLS:
+            return self.DB_REPLICA_ASYNC_URLS
+        return [self._asyncpg_url(url) for url in self.DB_REPLICA_URLS]
+
+    @property
+    def async_shard_urls(self) -> list[str]:
+        if self.DB_SHARD_ASYNC_URLS:
+            return self.DB_SHARD_ASYNC_URLS
+        return [self._asyncpg_url(url) for url in self.DB_SHARD_URLS]
+
 
 config = Settings()
@@ -1,33 +1,279 @@
+import asyncio
 import contextlib
+import itertools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence
 
-from sqlalchemy import create_engine, Engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, make_url, text, Engine, NullPool
+from fastapi import Depends
+from fastapi.concurrency import contextmanager_in_threadpool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker, Session
 
 from src.conf.config import config
+from src.database.pool import InstrumentedQueuePool, InstrumentedAsyncAdaptedQueuePool
+from src.database.shards import ShardMap
+from src.services.metrics import instrument_pool
+from src.services.timing import instrument_engine
 
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: Engine | None = create_engine(url)
-        self._session_maker = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+    """
+    Owns the engine of the primary and, when replica URLs are given, one engine per read replica with a pool
+    of its own. Sessions go to the primary unless ``replica=True`` is asked for; replicas are taken in turn.
 
-    @contextlib.contextmanager
-    def session(self):
+    With shard URLs, users and their contacts are spread over the primary (shard 0) and the shards by
+    ``shard_map``; ``shard=`` picks the database of a session. The primary also keeps the global
+    ``user_directory`` that resolves an email to the user id, and so to the shard. Replicas are replicas of
+    the primary: reads of the users of other shards go to their shard.
+
+    Engines are created by the first session asked for, not by the constructor, so importing the app
+    loads no database driver and opens no pool. After ``close`` the next session creates them again.
+    """
+    def __init__(self, url: str, async_mode: bool = False, pool_size: int = 5, max_overflow: int = 10,
+                 pool_timeout: float = 30, pool_recycle: int = -1, pool_pre_ping: bool = False,
+                 replica_urls: Sequence[str] = (), shard_urls: Sequence[str] = ()):
+        self.async_mode = async_mode
+        self.url = url
+        self.replica_urls = list(replica_urls)
+        self.shard_urls = list(shard_urls)
+        self._options = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+        self._queue_options = {"pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": pool_timeout}
+        self.shard_map = ShardMap(1 + len(shard_urls))
+        self._engine: AsyncEngine | Engine | None = None
+        self._session_maker = None
+        self._replica_engines = []
+        self._replica_session_makers = []
+        self._shard_engines = []
+        self._shard_session_makers = []
+        self._ping_engines = []
+        self._ping_executor: ThreadPoolExecutor | None = None
+        # sync sessions are opened in the threadpool, so two of them can be the first at once
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self._session_maker is not None:
+                return
+            primary = self._create_engine(self.url)
+            # the pool gauges describe the primary, the pool of every engine is in pool_stats
+            instrument_pool(primary.sync_engine if self.async_mode else primary)
+            self._replica_engines = [self._create_engine(replica_url) for replica_url in self.replica_urls]
+            self._replica_session_makers = [self._create_session_maker(engine) for engine in self._replica_engines]
+            self._next_replica = itertools.cycle(self._replica_session_makers)
+            self._shard_engines = [self._create_engine(shard_url) for shard_url in self.shard_urls]
+            self._shard_session_makers = [self._create_session_maker(engine) for engine in self._shard_engines]
+            self._engine = primary
+            self._session_maker = self._create_session_maker(primary)
+
+    def _create_engine(self, url: str) -> AsyncEngine | Engine:
+        options = dict(self._options)
+        if make_url(url).get_backend_name() != 'sqlite':
+            # SQLite uses its own pool classes that have no queue to size or to wait on
+            options.update(poolclass=InstrumentedAsyncAdaptedQueuePool if self.async_mode else InstrumentedQueuePool,
+                           **self._queue_options)
+        engine = create_async_engine(url, **options) if self.async_mode else create_engine(url, **options)
+        instrument_engine(engine.sync_engine if self.async_mode else engine)
+        return engine
+
+    def _create_session_maker(self, engine):
+        if self.async_mode:
+            return async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self.replica_urls)
+
+    @property
+    def sharded(self) -> bool:
+        return self.shard_map.shards > 1
+
+    def shard_for(self, user_id: int) -> int:
+        return self.shard_map.shard_for(user_id)
+
+    def _pick_session_maker(self, replica: bool, shard: int = 0):
         if self._session_maker is None:
-            raise Exception('Session is not initialized')
-        session = self._session_maker()
+            self._connect()
+        if shard:
+            return self._shard_session_makers[shard - 1]
+        if replica and self._replica_session_makers:
+            return next(self._next_replica)
+        return self._session_maker
+
+    @staticmethod
+    def _engine_stats(engine) -> dict:
+        pool = engine.pool
+        stats = getattr(pool, 'stats', None)
+        if stats is None:
+            return {"pool": pool.status()}
+        return stats.snapshot(pool)
+
+    def pool_stats(self) -> dict:
+        if self._engine is None:
+            self._connect()
+        stats = self._engine_stats(self._engine)
+        if self._replica_engines:
+            stats["replicas"] = [self._engine_stats(engine) for engine in self._replica_engines]
+        if self._shard_engines:
+            stats["shards"] = [self._engine_stats(engine) for engine in self._shard_engines]
+        return stats
+
+    @contextlib.contextmanager
+    def session(self, expire_on_commit: bool = True, replica: bool = False, shard: int = 0):
+        if self.async_mode:
+            raise Exception('Sync sessions are not available in async mode')
+        session = self._pick_session_maker(replica, shard)(expire_on_commit=expire_on_commit)
         try:
             yield session
         except Exception as err:
             print(err)
             session.rollback()
+            raise
         finally:
             session.close()
 
+    @contextlib.asynccontextmanager
+    async def async_session(self, expire_on_commit: bool = True, replica: bool = False, shard: int = 0):
+        if not self.async_mode:
+            raise Exception('Async sessions are only available in async mode')
+        session = self._pick_session_maker(replica, shard)(expire_on_commit=expire_on_commit)
+        try:
+            yield session
+        except Exception as err:
+            print(err)
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    @staticmethod
+    def _connect_timeout(url: str, timeout: float) -> dict:
+        driver = make_url(url).get_driver_name()
+        if driver == 'asyncpg':
+            return {"timeout": timeout}
+        if driver in ('psycopg2', 'psycopg'):
+            # libpq takes whole seconds
+            return {"connect_timeout": max(1, math.ceil(timeout))}
+        return {}
 
-sessionmanager = DatabaseSessionManager(config.DB_URL)
+    async def ping(self, timeout: float = 2):
+        """
+        Runs ``SELECT 1`` on the primary and on every shard. The connections are opened for the ping and
+        closed after it, outside the pools: a pool exhausted by a burst of requests does not make the
+        database look down, and a ping never takes a connection from a request.
+
+        Connecting gives up after ``timeout``. A sync ping that hangs anyway cannot be cancelled, only
+        abandoned, so the sync pings run one at a time on a thread of their own: a database that does
+        not answer holds that one thread, not the threadpool of the routes or the default executor, which
+        also resolves host names for asyncio.
+        """
+        if not self._ping_engines:
+            self._ping_engines = [
+                (create_async_engine if self.async_mode else create_engine)(
+                    url, poolclass=NullPool, connect_args=self._connect_timeout(url, timeout))
+                for url in [self.url, *self.shard_urls]
+            ]
+        if self.async_mode:
+            for engine in self._ping_engines:
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+        else:
+            if self._ping_executor is None:
+                self._ping_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-ping")
+            await asyncio.get_running_loop().run_in_executor(self._ping_executor, self._ping_sync)
+
+    def _ping_sync(self):
+        for engine in self._ping_engines:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+    async def close(self):
+        for engine in self._ping_engines:
+            if self.async_mode:
+                await engine.dispose()
+            else:
+                engine.dispose()
+        self._ping_engines = []
+        if self._ping_executor is not None:
+            self._ping_executor.shutdown(wait=False, cancel_futures=True)
+            self._ping_executor = None
+        if self._engine is None:
+            return
+        for engine in [self._engine, *self._replica_engines, *self._shard_engines]:
+            if self.async_mode:
+                await engine.dispose()
+            else:
+                engine.dispose()
+        self._engine = None
+        self._session_maker = None
+        self._replica_engines = []
+        self._replica_session_makers = []
+        self._shard_engines = []
+        self._shard_session_makers = []
+
+
+sessionmanager = DatabaseSessionManager(
+    config.async_db_url if config.DB_ASYNC else config.DB_URL,
+    async_mode=config.DB_ASYNC,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    replica_urls=config.async_replica_urls if config.DB_ASYNC else config.DB_REPLICA_URLS,
+    shard_urls=config.async_shard_urls if config.DB_ASYNC else config.DB_SHARD_URLS,
+)
 
 
 def get_db():
     with sessionmanager.session() as session:
         yield session
+
+
+async def get_async_db():
+    async with sessionmanager.async_session() as session:
+        yield session
+
+
+# Dependency used by the ``async def`` routes: an ``AsyncSession`` when DB_ASYNC is enabled,
+# otherwise the regular sync ``Session`` whose I/O is pushed to the threadpool by src.database.helpers.
+get_session = get_async_db if sessionmanager.async_mode else get_db
+
+
+def get_write_session(db: AsyncSession | Session = Depends(get_session)):
+    """
+    The session of write routes: the request's session (FastAPI resolves get_session once per request, so
+    get_current_user shares it) with expire_on_commit turned off. The session ends with the request, so
+    expiring on commit would only cost a reload of every object read after the commit.
+    """
+    (db.sync_session if isinstance(db, AsyncSession) else db).expire_on_commit = False
+    return db
+
+
+@contextlib.asynccontextmanager
+async def open_session(expire_on_commit: bool = True, replica: bool = False, shard: int = 0):
+    """
+    A session of its own, next to the request's one, in either mode: in sync mode the blocking parts of
+    opening and closing it run in the threadpool.
+    """
+    if sessionmanager.async_mode:
+        async with sessionmanager.async_session(expire_on_commit, replica, shard) as session:
+            yield session
+    else:
+        async with contextmanager_in_threadpool(sessionmanager.session(expire_on_commit, replica, shard)) as session:
+            yield session
+
+
+@contextlib.asynccontextmanager
+async def shard_session(shard: int, db: AsyncSession | Session, expire_on_commit: bool = True):
+    """
+    The session of a shard: ``db``, the request's primary session, for shard 0, a session of its own otherwise.
+    """
+    if not shard:
+        yield db
+        return
+    async with open_session(expire_on_commit, shard=shard) as session:
+        yield session
@@ -0,0 +1,23 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+
+async def execute(db: AsyncSession | Session, stmt):
+    if isinstance(db, AsyncSession):
+        return await db.execute(stmt)
+    return await run_in_threadpool(db.execute, stmt)
+
+
+async def commit(db: AsyncSession | Session):
+    if isinstance(db, AsyncSession):
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+
+async def rollback(db: AsyncSession | Session):
+    if isinstance(db, AsyncSession):
+        await db.rollback()
+    else:
+        await run_in_threadpool(db.rollback)
@@ -0,0 +1,86 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from src.services.metrics import POOL_TIMEOUTS, POOL_WAIT
+
+
+class PoolStats:
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_counts = [0] * (len(self.WAIT_BUCKETS) + 1)
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_counts[bisect.bisect_left(self.WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+        POOL_WAIT.observe(seconds)
+        if timed_out:
+            POOL_TIMEOUTS.inc()
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            wait_counts = list(self.wait_counts)
+            stats = {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "wait_seconds_sum": self.wait_sum,
+            }
+        histogram, cumulative = {}, 0
+        for bound, count in zip([*map(str, self.WAIT_BUCKETS), "+Inf"], wait_counts):
+            cumulative += count
+            histogram[bound] = cumulative
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            wait_seconds_histogram=histogram,
+        )
+        return stats
+
+
+class _InstrumentedPoolMixin:
+    """
+    Times every checkout that goes through the pool queue, including the ones that end with
+    ``TimeoutError`` because ``pool_size + max_overflow`` connections are already checked out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
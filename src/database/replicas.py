@@ -0,0 +1,76 @@
+from fastapi import Depends, Request
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.db import get_session, get_write_session, open_session, sessionmanager, shard_session
+from src.emtity.models import Users
+from src.services.auth import auth_service
+
+
+class ReadYourWrites:
+    """
+    Pins the reads of a user to the primary for ``window`` seconds after each of their writes, so they never
+    read a replica that has not replayed the write yet. The marker is a Redis key with that TTL, shared by
+    all workers; when Redis cannot be asked, reads go to the primary.
+    """
+    PREFIX = "db:primary:"
+
+    def __init__(self, window: float):
+        self.window_ms = int(window * 1000)
+        self.redis: Redis | None = None
+
+    async def mark(self, user_id: int):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(f"{self.PREFIX}{user_id}", 1, px=self.window_ms)
+        except RedisError:
+            pass
+
+    async def is_pinned(self, user_id: int) -> bool:
+        if self.redis is None:
+            return True
+        try:
+            return bool(await self.redis.exists(f"{self.PREFIX}{user_id}"))
+        except RedisError:
+            return True
+
+
+read_your_writes = ReadYourWrites(config.DB_READ_YOUR_WRITES_SECONDS)
+
+
+async def use_replica(user_id: int) -> bool:
+    # Without replicas no Redis lookup is made; replicas only serve the users of the primary
+    return sessionmanager.has_replicas and not sessionmanager.shard_for(user_id) \
+        and not await read_your_writes.is_pinned(user_id)
+
+
+async def get_read_session(request: Request, user: Users = Depends(auth_service.get_current_user),
+                           db: AsyncSession | Session = Depends(get_session)):
+    """
+    The session of read-only routes: a replica session, unless there are no replicas or the user wrote within
+    the read-your-writes window. Then it is the request's primary session, the one get_current_user used.
+    The users of the other shards read from their shard. Replica reads are flagged on ``request.state`` for
+    the response cache.
+    """
+    shard = sessionmanager.shard_for(user.id)
+    if shard or not await use_replica(user.id):
+        async with shard_session(shard, db) as session:
+            yield session
+        return
+    request.state.replica_read = True
+    async with open_session(replica=True) as session:
+        yield session
+
+
+async def get_user_session(user: Users = Depends(auth_service.get_current_user),
+                           db: AsyncSession | Session = Depends(get_write_session)):
+    """
+    The session of the routes that write the user's contacts: the request's session when the user lives on
+    the primary, otherwise a session of the user's shard. Either way expire_on_commit is off.
+    """
+    async with shard_session(sessionmanager.shard_for(user.id), db, expire_on_commit=False) as session:
+        yield session
@@ -1,13 +1,24 @@
 import enum
+from datetime import date
 
-from sqlalchemy import Column, String, Integer, Date, ForeignKey, DateTime, func
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy import Column, String, Integer, SmallInteger, Date, ForeignKey, DateTime, Boolean, Index, DDL, event, \
+    func, PrimaryKeyConstraint
+from sqlalchemy.orm import DeclarativeBase, relationship, validates
 
 
 class Base(DeclarativeBase):
     pass
 
 
+def month_day(value: date | None) -> int | None:
+    """
+    Recurring-date key used for birthdays: ``month * 100 + day``, e.g. 1231 for December 31st.
+    """
+    if value is None:
+        return None
+    return value.month * 100 + value.day
+
+
 class Contact(Base):
     __tablename__ = 'contacts'
 
@@ -17,11 +28,37 @@ class Contact(Base):
     email = Column(String)
     phone_number = Column(String)
     birthday = Column(Date)
+    birthday_md = Column(SmallInteger, nullable=True)
     created_at = Column('created_at', DateTime, default=func.now(), nullable=True)
     updated_at = Column('updated_at', DateTime, default=func.now(), onupdate=func.now(), nullable=True)
     additional_data = Column(String, nullable=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    user = relationship("User", backref="contacts", lazy='joined')
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user = relationship("Users", back_populates="contacts")
+
+    # INSERT/UPDATE ... RETURNING brings back id and the timestamps in the same round trip.
+    # The identity includes the partition key, so the UPDATE/DELETE statements of a flush carry
+    # ``user_id`` too and touch a single partition.
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id, user_id]}
+    # On Postgres the table is hash-partitioned by user_id and its primary key, which must contain
+    # the partition key, is (user_id, id), added with the partitions after create. SQLite keeps a
+    # plain table keyed by ``id`` alone, so that the id stays the auto-assigned rowid.
+    __table_args__ = (
+        PrimaryKeyConstraint('id').ddl_if(dialect='sqlite'),
+        Index('ix_contacts_user_id_id', 'user_id', 'id').ddl_if(dialect='sqlite'),
+        Index('ix_contacts_user_id_birthday_md', 'user_id', 'birthday_md'),
+        Index('ix_contacts_first_name_trgm', 'first_name', postgresql_using='gin',
+              postgresql_ops={'first_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_last_name_trgm', 'last_name', postgresql_using='gin',
+              postgresql_ops={'last_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_email_trgm', 'email', postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        {'postgresql_partition_by': 'HASH (user_id)'},
+    )
+
+    @validates('birthday')
+    def _set_birthday_md(self, key, value):
+        self.birthday_md = month_day(value)
+        return value
 
 
 class Users(Base):
@@ -31,9 +68,60 @@ class Users(Base):
     username = Column(String(50))
     email = Column(String(150), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
-    refresh_token = Column(String(255), nullable=True)
+    confirmed = Column(Boolean, default=False)
     created_at = Column('created_at', DateTime, default=func.now())
     updated_at = Column('updated_at', DateTime, default=func.now(), onupdate=func.now())
-    contacts = relationship("Contact", backref="user")
+    contacts = relationship("Contact", back_populates="user")
+
+    __mapper_args__ = {"eager_defaults": True}
+
+
+# Global email -> user id lookup, kept on the primary. It allocates the user ids, which are unique across
+# shards, and the id gives the shard of the user (see src.database.shards.ShardMap).
+class UserDirectory(Base):
+    __tablename__ = 'user_directory'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    email = Column(String(150), nullable=False, unique=True)
+
+
+# SQLite has no pg_trgm: contacts search uses an external-content FTS5 table with the trigram
+# tokenizer instead, kept in sync by triggers (the same DDL is applied by the Alembic migration).
+CONTACTS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+)
+
+for statement in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect='sqlite'))
+
+
+# Every contacts query filters on ``user_id``, so Postgres prunes it down to one of these partitions.
+CONTACTS_PARTITIONS = 16
+
+
+def contacts_partitions_ddl(table: str = 'contacts', partitions: int = CONTACTS_PARTITIONS) -> list[str]:
+    """
+    Primary key and hash partitions of a contacts table created with ``PARTITION BY HASH (user_id)``.
+    """
+    return [f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (user_id, id)"] + [
+        f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
 
 
+for statement in contacts_partitions_ddl():
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
@@ -1,28 +1,176 @@
+import io
 from datetime import datetime, timedelta
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import (select, insert, update, delete, func, or_, case, table, column, literal_column, any_,
+                        bindparam, Integer)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from src.emtity.models import Contact, Users
-from src.schemas.contact import ContactCreate
+from src.database.helpers import execute, commit
+from src.emtity.models import Contact, Users, month_day
+from src.schemas.contact import ContactCreate, ContactUpdate
 
+contacts_fts = table('contacts_fts', column('rowid'), column('rank'))
 
-def get_contacts(limit: int, offset: int, db: Session, user: Users):
+# The columns ContactResponse exposes. Read paths select just these as plain rows: no join on users and
+# no ORM instances, so nothing is hydrated or tracked in the identity map.
+RESPONSE_COLUMNS = ('id', 'first_name', 'last_name', 'email', 'phone_number', 'birthday', 'additional_data')
+
+IMPORT_COLUMNS = ('first_name', 'last_name', 'email', 'phone_number', 'birthday', 'birthday_md', 'additional_data',
+                  'user_id', 'created_at', 'updated_at')
+
+
+def _response_columns():
+    return [getattr(Contact, name) for name in RESPONSE_COLUMNS]
+
+
+def _select_rows():
+    return select(*_response_columns())
+
+
+def _owned(user: Users, ids: list[int], dialect: str):
+    """
+    The WHERE clause of the set-based statements: the given ids among the contacts of the user.
+    PostgreSQL gets ``id = ANY(:ids)`` with the ids as one array parameter, so the statement text and its
+    cached plan do not depend on how many ids there are; elsewhere it is an IN list.
+    """
+    if dialect == 'postgresql':
+        return Contact.user_id == user.id, Contact.id == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
+    return Contact.user_id == user.id, Contact.id.in_(ids)
+
+
+def _update_stmt(user: Users, ids: list[int], values: dict, dialect: str):
+    # A Core-level update skips the birthday validator of the model, so birthday_md is set here
+    if 'birthday' in values:
+        values = {**values, 'birthday_md': month_day(values['birthday'])}
+    return (
+        update(Contact)
+        .where(*_owned(user, ids, dialect))
+        .values(**values)
+        .returning(*_response_columns())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_stmt(user: Users, ids: list[int], dialect: str):
+    return (
+        delete(Contact)
+        .where(*_owned(user, ids, dialect))
+        .returning(Contact.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _import_rows(bodies: list[ContactCreate], user_id: int) -> list[dict]:
+    # Core inserts and COPY bypass the ORM, so birthday_md and the timestamps are filled in here
+    now = datetime.now()
+    return [
+        {**body.model_dump(), 'birthday_md': month_day(body.birthday), 'user_id': user_id,
+         'created_at': now, 'updated_at': now}
+        for body in bodies
+    ]
+
+
+def _copy_field(value) -> str:
+    # COPY's CSV format reads an unquoted empty field as NULL: NULL gets its own marker and every value
+    # is quoted, so an empty string is stored as an empty string, the same as through INSERT
+    if value is None:
+        return r'\N'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows_psycopg2(db: Session, rows: list[dict]):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_copy_field(row[name]) for name in IMPORT_COLUMNS) + '\n')
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY contacts ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                           buffer)
+    finally:
+        cursor.close()
+
+
+def _birthdays_stmt(user: Users, days: int):
     """
-    The get_contacts function returns a list of contacts for the user.
+    Builds the upcoming birthdays statement on the indexed ``(user_id, birthday_md)`` pair.
+    The window is translated to a ``birthday_md`` range; when it crosses the new year the range
+    wraps around and the contacts are ordered by their next birthday.
+    """
+    today = datetime.now().date()
+    start = month_day(today)
+    end = month_day(today + timedelta(days=days))
+    stmt = _select_rows().where(Contact.user_id == user.id)
+    if days >= 365:
+        return stmt.filter(Contact.birthday_md.is_not(None)).order_by(
+            case((Contact.birthday_md < start, 1), else_=0), Contact.birthday_md)
+    if start <= end:
+        return stmt.filter(Contact.birthday_md.between(start, end)).order_by(Contact.birthday_md)
+    return stmt.filter(or_(Contact.birthday_md >= start, Contact.birthday_md <= end)).order_by(
+        case((Contact.birthday_md < start, 1), else_=0), Contact.birthday_md)
+
+
+def _search_stmt(query: str, user: Users, limit: int, dialect: str):
+    """
+    Builds the ranked search statement for the database in use:
+
+    - PostgreSQL: ILIKE served by the pg_trgm GIN indexes, ranked by trigram similarity;
+    - SQLite: MATCH on the trigram FTS5 table ``contacts_fts``, ranked by bm25;
+    - anything else, and queries shorter than a trigram: plain ILIKE ordered by name.
+    """
+    stmt = _select_rows().where(Contact.user_id == user.id).limit(limit)
+    if dialect == 'sqlite' and len(query) >= 3:
+        phrase = '"' + query.replace('"', '""') + '"'
+        return (
+            stmt.join(contacts_fts, contacts_fts.c.rowid == Contact.id)
+            .filter(literal_column('contacts_fts').op('MATCH')(phrase))
+            .order_by(contacts_fts.c.rank)
+        )
+
+    pattern = '%' + query.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+    stmt = stmt.filter(or_(
+        Contact.first_name.ilike(pattern, escape='/'),
+        Contact.last_name.ilike(pattern, escape='/'),
+        Contact.email.ilike(pattern, escape='/'),
+    ))
+    if dialect == 'postgresql':
+        rank = func.greatest(
+            func.similarity(Contact.first_name, query),
+            func.similarity(Contact.last_name, query),
+            func.similarity(Contact.email, query),
+        )
+        return stmt.order_by(rank.desc(), Contact.id)
+    return stmt.order_by(Contact.last_name, Contact.first_name, Contact.id)
+
+
+def get_contacts(limit: int, offset: int, db: Session, user: Users, after: int | None = None):
+    """
+    The get_contacts function returns a list of contacts for the user ordered by id.
         Args:
             limit (int): The number of items to return.
             offset (int): The number of items to skip before returning results.
+            after (int | None): Keyset cursor, the id of the last contact of the previous page.
+                When given, the offset is ignored and the page is read from the (user_id, id) index
+                so its cost does not depend on how deep the page is.
 
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Set the offset of the query
     :param db: Session: Access the database
     :param user: Users: Filter the contacts by user
+    :param after: int | None: Return only contacts with a greater id
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(user=user).offset(offset).limit(limit).all()
+    stmt = _select_rows().where(Contact.user_id == user.id).order_by(Contact.id)
+    if after is not None:
+        stmt = stmt.where(Contact.id > after)
+    else:
+        stmt = stmt.offset(offset)
+    contacts = db.execute(stmt.limit(limit)).all()
     if not contacts:
         return {"message": "Список контактов пуст"}
     return contacts
@@ -42,8 +190,8 @@ def get_contact(contact_id: int, db: Session, user: Users):
     :return: The contact that matches the given id and user
     :doc-author: Trelent
     """
-    query = select(Contact).filter_by(id=contact_id, user=user)
-    contact = db.execute(query).scalar_one_or_none()
+    query = _select_rows().where(Contact.id == contact_id, Contact.user_id == user.id)
+    contact = db.execute(query).one_or_none()
     return contact
 
 
@@ -57,13 +205,14 @@ def create_contact(body: ContactCreate, db: Session, user: Users):
     :param body: ContactCreate: Validate the data that is passed to the function
     :param db: Session: Access the database
     :param user: Users: Get the user_id from the token
-    :return: A contact object
+    :return: A contact object; the INSERT returns its id and timestamps, so with expire_on_commit
+        off it is usable after the commit without another query
     :doc-author: Trelent
     """
     if not user:
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
     try:
-        contact = Contact(**body.model_dump(), user=user)
+        contact = Contact(**body.model_dump(), user_id=user.id)
         db.add(contact)
         db.commit()
         return contact
@@ -71,6 +220,30 @@ def create_contact(body: ContactCreate, db: Session, user: Users):
         raise HTTPException(status_code=400, detail="Помилка створення контакту")
 
 
+def insert_contacts(bodies: list[ContactCreate], db: Session, user_id: int) -> int:
+    """
+    The insert_contacts function inserts a chunk of already validated contacts in one round trip
+    and commits it. On PostgreSQL with psycopg2 the rows are sent with COPY, elsewhere with a
+    multi-row INSERT.
+
+    :param bodies: list[ContactCreate]: The contacts to insert
+    :param db: Session: Access the database
+    :param user_id: int: The id of the owner of the contacts; an id rather than the user object,
+        because every chunk commits and expires the objects loaded in the session
+    :return: The number of inserted contacts
+    :doc-author: Trelent
+    """
+    rows = _import_rows(bodies, user_id)
+    if not rows:
+        return 0
+    if db.get_bind().dialect.driver == 'psycopg2':
+        _copy_rows_psycopg2(db, rows)
+    else:
+        db.execute(insert(Contact), rows)
+    db.commit()
+    return len(rows)
+
+
 def update_contact(contact_id: int, body: ContactCreate, db: Session,
                    user: Users):
     """
@@ -86,18 +259,33 @@ def update_contact(contact_id: int, body: ContactCreate, db: Session,
     :return: The updated contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id, user=user).first()
+    stmt = _update_stmt(user, [contact_id], body.model_dump(), db.get_bind().dialect.name)
+    contact = db.execute(stmt).one_or_none()
     if contact is None:
         raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    db.commit()
+    return contact
 
-    contact_data = vars(body)
-    for field, value in contact_data.items():
-        setattr(contact, field, value)
 
-    db.commit()
-    db.refresh(contact)
+def update_contacts(ids: list[int], body: ContactUpdate, db: Session, user: Users):
+    """
+    The update_contacts function applies the same changes to several contacts of the user
+    with a single UPDATE ... RETURNING statement.
+    Ids that do not exist or belong to another user are skipped.
 
-    return contact
+    :param ids: list[int]: The ids of the contacts to update
+    :param body: ContactUpdate: The fields to change, fields left out or null are kept
+    :param db: Session: Access the database
+    :param user: Users: Get the user who is logged in
+    :return: The updated contacts
+    :doc-author: Trelent
+    """
+    values = body.model_dump(exclude_none=True)
+    if not values:
+        return []
+    contacts = db.execute(_update_stmt(user, ids, values, db.get_bind().dialect.name)).all()
+    db.commit()
+    return contacts
 
 
 def delete_contact(contact_id: int, db: Session, user: Users):
@@ -113,60 +301,307 @@ def delete_contact(contact_id: int, db: Session, user: Users):
     :return: A dictionary with the message key
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id, user=user).first()
-    if contact is None:
+    deleted = db.execute(_delete_stmt(user, [contact_id], db.get_bind().dialect.name)).scalar_one_or_none()
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Контакт не знайдено")
-    db.delete(contact)
     db.commit()
     return {"message": "Контакт видалено успішно"}
 
 
-def search_contact(query: str, db: Session, user: Users):
+def delete_contacts(ids: list[int], db: Session, user: Users) -> list[int]:
+    """
+    The delete_contacts function deletes several contacts of the user with a single DELETE ... RETURNING statement.
+    Ids that do not exist or belong to another user are skipped.
+
+    :param ids: list[int]: The ids of the contacts to delete
+    :param db: Session: Get access to the database
+    :param user: Users: Ensure that only contacts of this user are deleted
+    :return: The ids of the deleted contacts
+    :doc-author: Trelent
+    """
+    deleted = list(db.execute(_delete_stmt(user, ids, db.get_bind().dialect.name)).scalars())
+    db.commit()
+    return deleted
+
+
+def get_contacts_by_ids(ids: list[int], db: Session, user: Users):
+    """
+    The get_contacts_by_ids function returns the contacts of the user with the given ids in one SELECT,
+    ordered by id. Ids that do not exist or belong to another user are skipped.
+
+    :param ids: list[int]: The ids of the contacts to retrieve
+    :param db: Session: Pass the database session to the function
+    :param user: Users: Ensure that the user is authorized to access these contacts
+    :return: A list of contacts
+    :doc-author: Trelent
+    """
+    stmt = _select_rows().where(*_owned(user, ids, db.get_bind().dialect.name)).order_by(Contact.id)
+    return db.execute(stmt).all()
+
+
+def search_contact(query: str, db: Session, user: Users, limit: int = 20):
     """
     The search_contact function searches for contacts in the database.
+    Results are ranked by relevance, the best match first.
         Args:
             query (str): The search term to look for.
             db (Session): The database session object.
             user (Users): The user who is searching for a contact.
+            limit (int): The maximum number of contacts to return.
 
     :param query: str: Filter the contacts by first name, last name or email
     :param db: Session: Pass the database session to the function
     :param user: Users: Filter the query by user
+    :param limit: int: Limit the number of contacts returned
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = (
-        db.query(Contact)
-        .filter_by(user=user)
-        .filter(
-            (Contact.first_name.ilike(f"%{query}%")) |
-            (Contact.last_name.ilike(f"%{query}%")) |
-            (Contact.email.ilike(f"%{query}%"))
-        )
-        .all()
+    stmt = _search_stmt(query, user, limit, db.get_bind().dialect.name)
+    return db.execute(stmt).all()
+
+
+def _export_stmt(user_id: int, batch_size: int):
+    # yield_per streams the rows with a server-side cursor where the driver supports it
+    return (
+        _select_rows()
+        .where(Contact.user_id == user_id)
+        .order_by(Contact.id)
+        .execution_options(yield_per=batch_size)
     )
-    return contacts
 
 
-def upcoming_birthdays(db: Session, user: Users):
+def stream_contacts(db: Session, user_id: int, batch_size: int = 1000):
     """
-    The upcoming_birthdays function returns a list of contacts whose birthdays are within the next week.
+    The stream_contacts function yields all contacts of the user in batches of plain rows
+    (no ORM objects), reading them through a server-side cursor, so memory use does not
+    grow with the number of contacts.
+
+    :param db: Session: Access the database
+    :param user_id: int: The id of the owner of the contacts
+    :param batch_size: int: The number of rows fetched from the cursor at a time
+    :return: A generator of lists of rows
+    :doc-author: Trelent
+    """
+    result = db.execute(_export_stmt(user_id, batch_size))
+    for partition in result.partitions():
+        yield partition
+
+
+def upcoming_birthdays(db: Session, user: Users, days: int = 7):
+    """
+    The upcoming_birthdays function returns a list of contacts whose birthdays are within the next days.
+    Birthdays recur every year, so the year of birth is ignored and the window may span the new year.
 
     :param db: Session: Pass in a database session, which is used to query the database
     :param user: Users: Filter the contacts by user
-    :return: A list of contacts with birthdays
+    :param days: int: The size of the window in days, today included
+    :return: A list of contacts with birthdays, the nearest first
     :doc-author: Trelent
     """
-    today = datetime.now().date()
-    next_week = today + timedelta(days=7)
-    birthdays = (
-        db.query(Contact)
-        .filter_by(user=user)
-        .filter(
-            (Contact.birthday >= today) &
-            (Contact.birthday <= next_week)
-        )
-        .order_by(Contact.birthday)
-        .all()
-    )
-    return birthdays
+    return db.execute(_birthdays_stmt(user, days)).all()
+
+
+async def get_contacts_async(limit: int, offset: int, db: AsyncSession | Session, user: Users,
+                             after: int | None = None):
+    """
+    The get_contacts_async function is the awaitable version of get_contacts used by the routes.
+    It works with both an AsyncSession (DB_ASYNC mode) and a regular Session.
+
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Set the offset of the query
+    :param db: AsyncSession | Session: Access the database
+    :param user: Users: Filter the contacts by user
+    :param after: int | None: Return only contacts with a greater id
+    :return: A list of contacts
+    """
+    stmt = _select_rows().where(Contact.user_id == user.id).order_by(Contact.id)
+    if after is not None:
+        stmt = stmt.where(Contact.id > after)
+    else:
+        stmt = stmt.offset(offset)
+    result = await execute(db, stmt.limit(limit))
+    return result.all()
+
+
+async def get_contact_async(contact_id: int, db: AsyncSession | Session, user: Users):
+    """
+    The get_contact_async function is the awaitable version of get_contact.
+
+    :param contact_id: int: Specify the contact to retrieve
+    :param db: AsyncSession | Session: Pass the database session to the function
+    :param user: Users: Ensure that the user is authorized to access this contact
+    :return: The contact that matches the given id and user
+    """
+    stmt = _select_rows().where(Contact.id == contact_id, Contact.user_id == user.id)
+    result = await execute(db, stmt)
+    return result.one_or_none()
+
+
+async def create_contact_async(body: ContactCreate, db: AsyncSession | Session, user: Users):
+    """
+    The create_contact_async function is the awaitable version of create_contact.
+
+    :param body: ContactCreate: Validate the data that is passed to the function
+    :param db: AsyncSession | Session: Access the database
+    :param user: Users: Get the user_id from the token
+    :return: A contact object
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Неверный email или пароль")
+    try:
+        contact = Contact(**body.model_dump(), user_id=user.id)
+        db.add(contact)
+        await commit(db)
+        return contact
+    except Exception:
+        raise HTTPException(status_code=400, detail="Помилка створення контакту")
+
+
+async def insert_contacts_async(bodies: list[ContactCreate], db: AsyncSession | Session, user_id: int) -> int:
+    """
+    The insert_contacts_async function is the awaitable version of insert_contacts.
+    On PostgreSQL with asyncpg the rows are sent with COPY.
+
+    :param bodies: list[ContactCreate]: The contacts to insert
+    :param db: AsyncSession | Session: Access the database
+    :param user_id: int: The id of the owner of the contacts
+    :return: The number of inserted contacts
+    """
+    if not isinstance(db, AsyncSession):
+        return await run_in_threadpool(insert_contacts, bodies, db, user_id)
+    rows = _import_rows(bodies, user_id)
+    if not rows:
+        return 0
+    if db.get_bind().dialect.driver == 'asyncpg':
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            'contacts', columns=IMPORT_COLUMNS, records=[tuple(row[name] for name in IMPORT_COLUMNS) for row in rows])
+    else:
+        await db.execute(insert(Contact), rows)
+    await db.commit()
+    return len(rows)
+
+
+async def update_contact_async(contact_id: int, body: ContactCreate, db: AsyncSession | Session, user: Users):
+    """
+    The update_contact_async function is the awaitable version of update_contact.
+
+    :param contact_id: int: Get the contact id from the url
+    :param body: ContactCreate: Pass the data from the request body
+    :param db: AsyncSession | Session: Access the database
+    :param user: Users: Get the user who is logged in
+    :return: The updated contact
+    """
+    result = await execute(db, _update_stmt(user, [contact_id], body.model_dump(), db.get_bind().dialect.name))
+    contact = result.one_or_none()
+    if contact is None:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    await commit(db)
+    return contact
+
+
+async def update_contacts_async(ids: list[int], body: ContactUpdate, db: AsyncSession | Session, user: Users):
+    """
+    The update_contacts_async function is the awaitable version of update_contacts.
+
+    :param ids: list[int]: The ids of the contacts to update
+    :param body: ContactUpdate: The fields to change, fields left out or null are kept
+    :param db: AsyncSession | Session: Access the database
+    :param user: Users: Get the user who is logged in
+    :return: The updated contacts
+    """
+    values = body.model_dump(exclude_none=True)
+    if not values:
+        return []
+    result = await execute(db, _update_stmt(user, ids, values, db.get_bind().dialect.name))
+    contacts = result.all()
+    await commit(db)
+    return contacts
+
+
+async def delete_contact_async(contact_id: int, db: AsyncSession | Session, user: Users):
+    """
+    The delete_contact_async function is the awaitable version of delete_contact.
+
+    :param contact_id: int: Specify the id of the contact to be deleted
+    :param db: AsyncSession | Session: Get access to the database
+    :param user: Users: Ensure that the user who is trying to delete a contact is the owner of this contact
+    :return: A dictionary with the message key
+    """
+    result = await execute(db, _delete_stmt(user, [contact_id], db.get_bind().dialect.name))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    await commit(db)
+    return {"message": "Контакт видалено успішно"}
+
+
+async def delete_contacts_async(ids: list[int], db: AsyncSession | Session, user: Users) -> list[int]:
+    """
+    The delete_contacts_async function is the awaitable version of delete_contacts.
+
+    :param ids: list[int]: The ids of the contacts to delete
+    :param db: AsyncSession | Session: Get access to the database
+    :param user: Users: Ensure that only contacts of this user are deleted
+    :return: The ids of the deleted contacts
+    """
+    result = await execute(db, _delete_stmt(user, ids, db.get_bind().dialect.name))
+    deleted = list(result.scalars())
+    await commit(db)
+    return deleted
+
+
+async def get_contacts_by_ids_async(ids: list[int], db: AsyncSession | Session, user: Users):
+    """
+    The get_contacts_by_ids_async function is the awaitable version of get_contacts_by_ids.
+
+    :param ids: list[int]: The ids of the contacts to retrieve
+    :param db: AsyncSession | Session: Pass the database session to the function
+    :param user: Users: Ensure that the user is authorized to access these contacts
+    :return: A list of contacts
+    """
+    stmt = _select_rows().where(*_owned(user, ids, db.get_bind().dialect.name)).order_by(Contact.id)
+    result = await execute(db, stmt)
+    return result.all()
+
+
+async def search_contact_async(query: str, db: AsyncSession | Session, user: Users, limit: int = 20):
+    """
+    The search_contact_async function is the awaitable version of search_contact.
+
+    :param query: str: Filter the contacts by first name, last name or email
+    :param db: AsyncSession | Session: Pass the database session to the function
+    :param user: Users: Filter the query by user
+    :param limit: int: Limit the number of contacts returned
+    :return: A list of contacts
+    """
+    stmt = _search_stmt(query, user, limit, db.get_bind().dialect.name)
+    result = await execute(db, stmt)
+    return result.all()
+
+
+async def stream_contacts_async(db: AsyncSession, user_id: int, batch_size: int = 1000):
+    """
+    The stream_contacts_async function is the asynchronous version of stream_contacts.
+
+    :param db: AsyncSession: Access the database
+    :param user_id: int: The id of the owner of the contacts
+    :param batch_size: int: The number of rows fetched from the cursor at a time
+    :return: An asynchronous generator of lists of rows
+    """
+    result = await db.stream(_export_stmt(user_id, batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def upcoming_birthdays_async(db: AsyncSession | Session, user: Users, days: int = 7):
+    """
+    The upcoming_birthdays_async function is the awaitable version of upcoming_birthdays.
+
+    :param db: AsyncSession | Session: Pass in a database session, which is used to query the database
+    :param user: Users: Filter the contacts by user
+    :param days: int: The size of the window in days, today included
+    :return: A list of contacts with birthdays, the nearest first
+    """
+    result = await execute(db, _birthdays_stmt(user, days))
+    return result.all()
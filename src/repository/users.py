@@ -1,10 +1,13 @@
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import select, update, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
-from src.emtity.models import Users
+from src.database.db import get_db, open_session, sessionmanager, shard_session
+from src.database.helpers import execute, commit
+from src.emtity.models import Users, UserDirectory
 from src.schemas.users import UserSchema
+from src.services.cache import user_cache
 
 
 def get_user_by_email(email: str, db: Session = Depends(get_db)):
@@ -22,52 +25,102 @@ def get_user_by_email(email: str, db: Session = Depends(get_db)):
     return user
 
 
-def create_user(body: UserSchema, db: Session = Depends(get_db)):
+async def get_shard_async(email: str, db: AsyncSession | Session) -> int | None:
     """
-    The create_user function creates a new user in the database.
+    The get_shard_async function resolves the shard that holds the user with this email through the
+    global user directory. Without shards everybody lives on the primary and no query is made.
+
+    :param email: str: The email of the user
+    :param db: AsyncSession | Session: The session of the primary, which holds the directory
+    :return: The shard of the user, or None if there is no such user
+    """
+    if not sessionmanager.sharded:
+        return 0
+    result = await execute(db, select(UserDirectory.id).filter_by(email=email))
+    user_id = result.scalar_one_or_none()
+    return None if user_id is None else sessionmanager.shard_for(user_id)
+
+
+async def get_user_by_email_async(email: str, db: AsyncSession | Session):
+    """
+    The get_user_by_email_async function is the awaitable version of get_user_by_email used by the routes.
+    The user is read from their shard.
+
+    :param email: str: Specify the type of the email parameter
+    :param db: AsyncSession | Session: Pass the database session of the primary into the function
+    :return: A single user object
+    """
+    shard = await get_shard_async(email, db)
+    if shard is None:
+        return None
+    stmt = select(Users).filter_by(email=email)
+    async with shard_session(shard, db) as session:
+        result = await execute(session, stmt)
+        return result.unique().scalar_one_or_none()
+
+
+async def create_user_async(body: UserSchema, db: AsyncSession | Session):
+    """
+    The create_user_async function creates a new user in the database.
+    The id of the user is allocated by the user directory and decides the shard the user is created on.
 
     :param body: UserSchema: Validate the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession | Session: Get the database session of the primary
     :return: The newly created user object
-    :doc-author: Trelent
     """
-    new_user = Users(**body.model_dump())
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    result = await execute(db, insert(UserDirectory).values(email=body.email).returning(UserDirectory.id))
+    new_user = Users(id=result.scalar_one(), **body.model_dump())
+    shard = sessionmanager.shard_for(new_user.id)
+    if not shard:
+        # one transaction for the directory entry and the user
+        db.add(new_user)
+        await commit(db)
+    else:
+        # the directory entry is committed first so that the email is taken; it is given back if the user
+        # could not be created on the shard (the shard session is rolled back)
+        await commit(db)
+        try:
+            async with open_session(expire_on_commit=False, shard=shard) as session:
+                session.add(new_user)
+                await commit(session)
+        except Exception:
+            await execute(db, delete(UserDirectory).where(UserDirectory.id == new_user.id))
+            await commit(db)
+            raise
+    await user_cache.invalidate(body.email)
     return new_user
 
 
-def update_token(user: Users, token: str | None, db: Session):
+async def update_password_async(user: Users, password: str, db: AsyncSession | Session):
     """
-    The update_token function updates the refresh token for a user in the database.
-        Args:
-            user (Users): The User object to update.
-            token (str | None): The new refresh token to store in the database. If None, then no change is made to this field.
-                This is useful if you want to clear out an existing value but don't have a new one yet, or if you just want
-                to update other fields and leave this one alone.
-
-    :param user: Users: Specify the type of user that is being passed in
-    :param token: str | None: Define the type of the token parameter
-    :param db: Session: Access the database
+    The update_password_async function stores a new password hash for the user.
+    It is used to transparently rehash passwords on login after BCRYPT_ROUNDS has changed.
+
+    :param user: Users: The user whose password hash is replaced
+    :param password: str: The new password hash
+    :param db: AsyncSession | Session: Access the database
     :return: None
-    :doc-author: Trelent
     """
-    user.refresh_token = token
-    db.commit()
+    async with shard_session(sessionmanager.shard_for(user.id), db) as session:
+        await execute(session, update(Users).where(Users.id == user.id).values(password=password)
+                      .execution_options(synchronize_session=False))
+        await commit(session)
 
 
-def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email_async(email: str, db: AsyncSession | Session) -> None:
     """
-    The confirmed_email function takes in an email and a database session,
+    The confirmed_email_async function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
 
-
     :param email: str: Specify the email of the user to be confirmed
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession | Session: Pass the database session of the primary to the function
     :return: None
-    :doc-author: Trelent
     """
-    user = get_user_by_email(email, db)
-    user.confirmed = True
-    db.commit()
+    shard = await get_shard_async(email, db)
+    if shard is None:
+        return
+    async with shard_session(shard, db) as session:
+        await execute(session, update(Users).where(Users.email == email).values(confirmed=True)
+                      .execution_options(synchronize_session=False))
+        await commit(session)
+    await user_cache.invalidate(email)
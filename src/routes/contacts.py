@@ -1,104 +1,238 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
-from fastapi_limiter.depends import RateLimiter
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from fastapi_limiter import FastAPILimiter
 
-from src.database.db import get_db
+from src.database.replicas import get_read_session, get_user_session, read_your_writes, use_replica
 from src.emtity.models import Users
 from src.repository import contacts as repository_contacts
-from src.schemas.contact import ContactResponse, ContactCreate, ContactsResponse
+from src.schemas.contact import (ContactResponse, ContactCreate, ContactsResponse, ContactsImportResponse, ContactIds,
+                                 ContactsBulkUpdate, ContactsDeleteResponse)
 from src.services.auth import auth_service
+from src.services.contacts_export import export_contacts as export_contacts_stream, MEDIA_TYPES
+from src.services.contacts_import import ContactsImport
+from src.services.cache import response_cache
+from src.services.limits import rate_limit
+from src.services.serialization import render, records, negotiate
+from src.services.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
+# Built once: every page is validated and serialized in a single call into pydantic-core
+contacts_adapter = TypeAdapter(ContactsResponse)
+contact_list_adapter = TypeAdapter(List[ContactResponse])
+contact_adapter = TypeAdapter(ContactResponse)
+message_adapter = TypeAdapter(dict[str, str])
+
+
+async def written(user_id: int):
+    # After every write: the user's reads must go to the primary and their cached responses are stale.
+    # Pinned first: a read between the two calls must not cache a replica body under the new generation
+    await read_your_writes.mark(user_id)
+    await response_cache.bump(user_id)
 
 
 @router.get('/', response_model=ContactsResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def get_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0), db: Session = Depends(get_db),
-                 user: Users = Depends(auth_service.get_current_user)):
+            dependencies=[rate_limit('contacts:list', '10/60')])
+async def get_contacts(request: Request, limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+                       after: str | None = Query(None, description="next_cursor of the previous page"),
+                       db: AsyncSession | Session = Depends(get_read_session),
+                       user: Users = Depends(auth_service.get_current_user)):
     """
     The get_contacts function returns a list of contacts.
+    Responses are cached per user and carry an ETag, unchanged pages are answered with 304.
+    Clients sending Accept: application/msgpack get the same page as MessagePack.
 
+    :param request: Request: Read the If-None-Match and Accept headers
     :param limit: int: Limit the number of contacts returned
     :param ge: Set a minimum value for the limit parameter
     :param le: Limit the number of contacts returned
     :param offset: int: Skip a number of records
     :param ge: Set a minimum value for the parameter
+    :param after: str | None: Opaque cursor, when given the offset is ignored
     :param db: Session: Get the database session
     :param user: Users: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = repository_contacts.get_contacts(limit, offset, db, user)
-    if not contacts:
-        return []
-    return {"contacts": contacts}
+    after_id = decode_cursor(after) if after is not None else None
+
+    async def build(media_type: str):
+        contacts = await repository_contacts.get_contacts_async(limit, offset, db, user, after=after_id)
+        next_cursor = encode_cursor(contacts[-1].id) if len(contacts) == limit else None
+        return render(contacts_adapter, {"contacts": records(contacts), "next_cursor": next_cursor}, media_type)
+
+    return await response_cache.respond(request, user.id, build)
 
 
 @router.get('/search', response_model=ContactsResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def search_contact(query: str = Query(..., min_length=1, description="Пошуковий запит (ім'я, прізвище або email)"),
-                   db: Session = Depends(get_db), user: Users = Depends(auth_service.get_current_user)):
+            dependencies=[rate_limit('contacts:search', '10/60')])
+async def search_contact(request: Request, query: str = Query(..., min_length=1, description="Пошуковий запит (ім'я, прізвище або email)"),
+                         limit: int = Query(20, ge=1, le=100),
+                         db: AsyncSession | Session = Depends(get_read_session),
+                         user: Users = Depends(auth_service.get_current_user)):
     """
     The search_contact function allows you to search for contacts by name, surname or email.
 
+    :param request: Request: Read the If-None-Match and Accept headers
     :param query: str: Pass the search query to the function
     :param min_length: Set the minimum length of the query string
     :param description: Add a description to the parameter
     :param прізвище або email)&quot;): Describe the parameter in the documentation
+    :param limit: int: Limit the number of contacts returned, best matches first
     :param db: Session: Pass the database session to the function
     :param user: Users: Get the user id from the jwt token
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = repository_contacts.search_contact(query, db, user)
-    if not contacts:
-        return "Ничего не найдено"
-    return {"contacts": contacts}
+    async def build(media_type: str):
+        contacts = await repository_contacts.search_contact_async(query, db, user, limit)
+        return render(contacts_adapter, {"contacts": records(contacts)}, media_type)
+
+    return await response_cache.respond(request, user.id, build)
 
 
 @router.get('/birthdays', description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def upcoming_birthdays(db: Session = Depends(get_db), user: Users = Depends(auth_service.get_current_user)):
+            dependencies=[rate_limit('contacts:birthdays', '10/60')])
+async def upcoming_birthdays(request: Request, days: int = Query(7, ge=1, le=366),
+                             db: AsyncSession | Session = Depends(get_read_session),
+                             user: Users = Depends(auth_service.get_current_user)):
 
     """
     The upcoming_birthdays function returns a list of contacts with upcoming birthdays.
 
+    :param request: Request: Read the If-None-Match and Accept headers
+    :param days: int: The size of the window in days
     :param db: Session: Get a database session
     :param user: Users: Get the current user
-    :return: A list of contacts whose birthday is in the next 30 days
+    :return: A list of contacts whose birthday is in the next days, the nearest first
+    :doc-author: Trelent
+    """
+    async def build(media_type: str):
+        birthdays = await repository_contacts.upcoming_birthdays_async(db, user, days)
+        if not birthdays:
+            return render(message_adapter, {"message": "No BD"}, media_type)
+        return render(contact_list_adapter, records(birthdays), media_type)
+
+    return await response_cache.respond(request, user.id, build)
+
+
+@router.get('/export', response_class=StreamingResponse, description='No more than 10 requests per minute',
+            dependencies=[rate_limit('contacts:export', '10/60')])
+async def export_contacts(format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                          user: Users = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams all contacts of the current user as NDJSON or CSV.
+    Rows are read from a server-side cursor and written as they arrive, so the download starts
+    immediately and memory use does not depend on the number of contacts.
+
+    The export reads from a replica unless the user wrote within the read-your-writes window.
+
+    :param format: str: ndjson or csv
+    :param user: Users: Get the current user
+    :return: A streaming response with the contacts
+    :doc-author: Trelent
+    """
+    return StreamingResponse(
+        export_contacts_stream(user.id, format, replica=await use_replica(user.id)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
+    )
+
+
+@router.post('/batch-get', response_model=List[ContactResponse], description='No more than 10 requests per minute',
+             dependencies=[rate_limit('contacts:batch_get', '10/60')])
+async def batch_get_contacts(request: Request, body: ContactIds, db: AsyncSession | Session = Depends(get_read_session),
+                             user: Users = Depends(auth_service.get_current_user)):
+    """
+    The batch_get_contacts function returns the contacts with the given ids in one query.
+    Ids that do not exist or belong to another user are left out of the response.
+
+    :param request: Request: Read the Accept header
+    :param body: ContactIds: The ids of the contacts, at most 500
+    :param db: Session: Pass the database session to the function
+    :param user: Users: Get the current user
+    :return: A list of contacts ordered by id
+    :doc-author: Trelent
+    """
+    media_type = negotiate(request)
+    contacts = await repository_contacts.get_contacts_by_ids_async(body.ids, db, user)
+    return Response(content=render(contact_list_adapter, records(contacts), media_type), media_type=media_type)
+
+
+@router.patch('/bulk', response_model=List[ContactResponse], description='No more than 10 requests per minute',
+              dependencies=[rate_limit('contacts:bulk_update', '10/60')])
+async def update_contacts(body: ContactsBulkUpdate, db: AsyncSession | Session = Depends(get_user_session),
+                          user: Users = Depends(auth_service.get_current_user)):
+    """
+    The update_contacts function applies the same changes to several contacts in one statement.
+    Ids that do not exist or belong to another user are skipped.
+
+    :param body: ContactsBulkUpdate: The ids of the contacts, at most 500, and the fields to change
+    :param db: Session: Pass the database session to the repository
+    :param user: Users: Get the current user
+    :return: The updated contacts
+    :doc-author: Trelent
+    """
+    user_id = user.id
+    contacts = await repository_contacts.update_contacts_async(body.ids, body.changes, db, user)
+    if contacts:
+        await written(user_id)
+    return records(contacts)
+
+
+@router.delete('/bulk', response_model=ContactsDeleteResponse, description='No more than 10 requests per minute',
+               dependencies=[rate_limit('contacts:bulk_delete', '10/60')])
+async def delete_contacts(body: ContactIds, db: AsyncSession | Session = Depends(get_user_session),
+                          user: Users = Depends(auth_service.get_current_user)):
+    """
+    The delete_contacts function deletes several contacts in one statement.
+    Ids that do not exist or belong to another user are skipped.
+
+    :param body: ContactIds: The ids of the contacts, at most 500
+    :param db: Session: Pass the database session to the repository
+    :param user: Users: Get the current user
+    :return: The ids of the deleted contacts
     :doc-author: Trelent
     """
-    birthdays = repository_contacts.upcoming_birthdays(db,user)
-    if not birthdays:
-        return {"message": "No BD"}
-    return birthdays
+    user_id = user.id
+    deleted = await repository_contacts.delete_contacts_async(body.ids, db, user)
+    if deleted:
+        await written(user_id)
+    return {"deleted": deleted}
 
 
 @router.get('/{contact_id}', response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def get_contact(contact_id: int, db: Session = Depends(get_db), user: Users = Depends(auth_service.get_current_user)):
+            dependencies=[rate_limit('contacts:get', '10/60')])
+async def get_contact(request: Request, contact_id: int, db: AsyncSession | Session = Depends(get_read_session),
+                      user: Users = Depends(auth_service.get_current_user)):
 
     """
     The get_contact function returns a contact by its ID.
 
+    :param request: Request: Read the If-None-Match and Accept headers
     :param contact_id: int: Specify the type of data that will be passed to the function
     :param db: Session: Pass the database session to the function
     :param user: Users: Get the current user
     :return: The contact with the specified id
     :doc-author: Trelent
     """
-    contact = repository_contacts.get_contact(contact_id,db, user)
-    if contact is None:
-        raise HTTPException(status_code=404, detail="Контакт не найден")
-    return contact
+    async def build(media_type: str):
+        contact = await repository_contacts.get_contact_async(contact_id, db, user)
+        if contact is None:
+            raise HTTPException(status_code=404, detail="Контакт не найден")
+        return render(contact_adapter, contact._asdict(), media_type)
+
+    return await response_cache.respond(request, user.id, build)
 
 
 @router.post('/', response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              description='No more than 10 requests per minute',
-             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def create_contact(body: ContactCreate, db: Session = Depends(get_db),
-                   user: Users = Depends(auth_service.get_current_user)):
+             dependencies=[rate_limit('contacts:create', '10/60')])
+async def create_contact(body: ContactCreate, db: AsyncSession | Session = Depends(get_user_session),
+                         user: Users = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
 
@@ -108,14 +242,48 @@ def create_contact(body: ContactCreate, db: Session = Depends(get_db),
     :return: A contact object
     :doc-author: Trelent
     """
-    new_contact = repository_contacts.create_contact(body, db, user)
+    user_id = user.id
+    new_contact = await repository_contacts.create_contact_async(body, db, user)
+    await written(user_id)
     return new_contact
 
 
+@router.post('/bulk', response_model=ContactsImportResponse, description='No more than 10 requests per minute',
+             dependencies=[rate_limit('contacts:import', '10/60')])
+async def import_contacts(request: Request, db: AsyncSession | Session = Depends(get_user_session),
+                          user: Users = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function creates contacts in bulk from a streamed request body.
+    The body is either NDJSON (Content-Type: application/x-ndjson), one contact object per line,
+    or CSV (Content-Type: text/csv) with a header line naming the ContactCreate fields.
+    Every row is validated on its own and inserted in chunks, so memory use does not depend on
+    the size of the upload; invalid rows are reported by line number and skipped.
+
+    :param request: Request: Read the body as a stream
+    :param db: Session: Pass the database session to the repository layer
+    :param user: Users: Get the current user
+    :return: The number of inserted and failed rows and the errors of the failed rows
+    :doc-author: Trelent
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        fmt = 'ndjson'
+    elif content_type == 'text/csv':
+        fmt = 'csv'
+    else:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Use application/x-ndjson or text/csv")
+    contacts_import = ContactsImport(fmt, db, user)
+    report = await contacts_import.run(request.stream())
+    if report["inserted"]:
+        await written(contacts_import.user_id)
+    return report
+
+
 @router.put('/{contact_id}', response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def update_contact(contact_id: int, body: ContactCreate, db: Session = Depends(get_db),
-                   user: Users = Depends(auth_service.get_current_user)):
+            dependencies=[rate_limit('contacts:update', '10/60')])
+async def update_contact(contact_id: int, body: ContactCreate, db: AsyncSession | Session = Depends(get_user_session),
+                         user: Users = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
         The function takes three arguments:
@@ -130,15 +298,17 @@ def update_contact(contact_id: int, body: ContactCreate, db: Session = Depends(g
     :return: The updated contact
     :doc-author: Trelent
     """
-    updated_contact = repository_contacts.update_contact(contact_id, body, db, user)
-    return updated_contact
+    user_id = user.id
+    updated_contact = await repository_contacts.update_contact_async(contact_id, body, db, user)
+    await written(user_id)
+    return updated_contact._asdict()
 
 
 @router.delete('/{contact_id}', status_code=status.HTTP_204_NO_CONTENT,
                description='No more than 10 requests per minute',
-               dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def delete_contact(contact_id: int, db: Session = Depends(get_db),
-                   user: Users = Depends(auth_service.get_current_user)):
+               dependencies=[rate_limit('contacts:delete', '10/60')])
+async def delete_contact(contact_id: int, db: AsyncSession | Session = Depends(get_user_session),
+                         user: Users = Depends(auth_service.get_current_user)):
     """
     The delete_contact function deletes a contact from the database.
         Args:
@@ -152,5 +322,7 @@ def delete_contact(contact_id: int, db: Session = Depends(get_db),
     :return: A dict with the following keys:
     :doc-author: Trelent
     """
-    delete_report = repository_contacts.delete_contact(contact_id, db, user)
+    user_id = user.id
+    delete_report = await repository_contacts.delete_contact_async(contact_id, db, user)
+    await written(user_id)
     return delete_report
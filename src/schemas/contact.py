@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 from datetime import date
 
@@ -11,15 +11,40 @@ class ContactBase(BaseModel):
     email: EmailStr
     phone_number: str
     birthday: date
-    additional_data: str = None
+    additional_data: Optional[str] = None
 
 
 class ContactCreate(ContactBase):
     pass
 
 
+class ContactUpdate(BaseModel):
+    # Fields left out or null are not changed
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone_number: Optional[str] = None
+    birthday: Optional[date] = None
+    additional_data: Optional[str] = None
+
+
+class ContactIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=500)
+
+
+class ContactsBulkUpdate(ContactIds):
+    changes: ContactUpdate
+
+
+class ContactsDeleteResponse(BaseModel):
+    deleted: List[int]
+
+
 class ContactResponse(ContactBase):
     id: int
+    # Stored emails were validated as EmailStr on the way in, checking them again on every read is
+    # the most expensive part of rendering a page
+    email: str = Field(json_schema_extra={"format": "email"})
 
     class Config:
         from_attributes = True
@@ -27,3 +52,15 @@ class ContactResponse(ContactBase):
 
 class ContactsResponse(BaseModel):
     contacts: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class ContactsImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ContactImportError]
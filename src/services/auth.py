@@ -1,27 +1,57 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
+from redis.exceptions import RedisError
 
-from src.database.db import get_db
+from src.database.db import get_session
 from src.repository import users as repository_users
+from src.services import passwords
+from src.services.cache import user_cache
+from src.services.sessions import session_store, ROTATED, REUSED
+from src.services.timing import phase
 from src.conf.config import config
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
-
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
-
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    REFRESH_TOKEN_TTL = 7 * 24 * 3600
+    _hash_executor: ProcessPoolExecutor | None = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._hash_executor is None:
+            # spawned, not forked: the pool is created inside the running app, whose threadpool threads
+            # a fork would copy mid-flight (locks held by them stay held in the child)
+            self._hash_executor = ProcessPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+        return self._hash_executor
+
+    async def hash_password(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(), passwords.hash_password, password,
+                                          config.BCRYPT_ROUNDS)
+
+    async def verify_and_update_password(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verifies the password in the hashing process pool. The second item of the result is a new hash
+        when the stored one was made with a different cost than BCRYPT_ROUNDS, otherwise None.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(), passwords.verify_and_update, plain_password,
+                                          hashed_password, config.BCRYPT_ROUNDS)
+
+    def shutdown(self):
+        if self._hash_executor is not None:
+            self._hash_executor.shutdown(cancel_futures=True)
+            self._hash_executor = None
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -40,22 +70,50 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=self.REFRESH_TOKEN_TTL)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
-    def decode_refresh_token(self, refresh_token: str):
+    def decode_refresh_token(self, refresh_token: str) -> dict:
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def create_session(self, email: str) -> str:
+        """Opens a refresh-token session for a new login and returns its first refresh token."""
+        try:
+            sid, jti = await session_store.create(self.REFRESH_TOKEN_TTL)
+        except RedisError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sessions unavailable")
+        return self.create_refresh_token(data={"sub": email, "sid": sid, "jti": jti})
+
+    async def rotate_session(self, refresh_token: str) -> tuple[str, str]:
+        """
+        Exchanges a refresh token for the next one of its session, without touching the database.
+        Returns the email of the user and the new refresh token. Reusing a rotated token ends the session.
+        """
+        payload = self.decode_refresh_token(refresh_token)
+        if "sid" not in payload or "jti" not in payload:
+            # issued before sessions moved to Redis
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        try:
+            result, jti = await session_store.rotate(payload["sid"], payload["jti"], self.REFRESH_TOKEN_TTL)
+        except RedisError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sessions unavailable")
+        if result == REUSED:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token reuse detected")
+        if result != ROTATED:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        email = payload["sub"]
+        return email, self.create_refresh_token(data={"sub": email, "sid": payload["sid"], "jti": jti})
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme),
+                               db: AsyncSession | Session = Depends(get_session)):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -63,7 +121,8 @@ class Auth:
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            with phase("jwt"):
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -73,9 +132,13 @@ class Auth:
         except JWTError:
             raise credentials_exception
 
-        user = repository_users.get_user_by_email(email, db)
-        if user is None:
-            raise credentials_exception
+        with phase("user"):
+            user = await user_cache.get(email)
+            if user is None:
+                user = await repository_users.get_user_by_email_async(email, db)
+                if user is None:
+                    raise credentials_exception
+                await user_cache.set(user)
         return user
 
     def create_email_token(self, data: dict):
@@ -0,0 +1,93 @@
+import json
+import time
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import config
+from src.emtity.models import Users
+from src.services.response_cache import ResponseCache
+
+
+class UserCache:
+    """
+    Two-tier cache of the users resolved by ``Auth.get_current_user``: a per-process LRU with a short TTL
+    in front of Redis. Only the columns needed to authorise a request are cached, never the password hash.
+
+    Writes invalidate both tiers of the current worker and the Redis tier for everybody; the LRU of the
+    other workers keeps a stale entry for at most ``local_ttl`` seconds, which is why it is kept short.
+    """
+    FIELDS = ("id", "username", "email", "confirmed")
+    KEY_PREFIX = "user:"
+
+    def __init__(self, maxsize: int, local_ttl: float, redis_ttl: int):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.redis: Redis | None = None
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    async def get(self, email: str) -> Users | None:
+        data = self._get_local(email)
+        if data is None and self.redis is not None:
+            try:
+                raw = await self.redis.get(self.KEY_PREFIX + email)
+            except RedisError:
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                self._set_local(email, data)
+        if data is None:
+            return None
+        # A fresh instance per call: a detached object can be attached to one session only
+        user = Users(**data)
+        make_transient_to_detached(user)
+        return user
+
+    async def set(self, user: Users):
+        data = {field: getattr(user, field) for field in self.FIELDS}
+        self._set_local(user.email, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.KEY_PREFIX + user.email, json.dumps(data), ex=self.redis_ttl)
+            except RedisError:
+                pass
+
+    async def invalidate(self, email: str):
+        self.invalidate_local(email)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self.KEY_PREFIX + email)
+            except RedisError:
+                pass
+
+    def invalidate_local(self, email: str):
+        self._local.pop(email, None)
+
+    def _get_local(self, email: str) -> dict | None:
+        entry = self._local.get(email)
+        if entry is None:
+            return None
+        expires, data = entry
+        if expires < time.monotonic():
+            self._local.pop(email, None)
+            return None
+        self._local.move_to_end(email)
+        return data
+
+    def _set_local(self, email: str, data: dict):
+        self._local[email] = (time.monotonic() + self.local_ttl, data)
+        self._local.move_to_end(email)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+user_cache = UserCache(
+    maxsize=config.USER_CACHE_SIZE,
+    local_ttl=config.USER_CACHE_LOCAL_TTL,
+    redis_ttl=config.USER_CACHE_REDIS_TTL,
+)
+
+response_cache = ResponseCache(ttl=config.RESPONSE_CACHE_TTL, replica_lag=config.DB_READ_YOUR_WRITES_SECONDS)
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from datetime import date
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.repository import contacts as repository_contacts
+from src.repository.contacts import RESPONSE_COLUMNS
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{value.__class__.__name__} is not JSON serializable')
+
+
+def _encode(rows, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(RESPONSE_COLUMNS, row)), ensure_ascii=False, default=_json_default) + "\n"
+                       for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _header(fmt: str) -> str:
+    return _encode([RESPONSE_COLUMNS], fmt) if fmt == "csv" else ""
+
+
+def _export_sync(user_id: int, fmt: str, replica: bool):
+    yield _header(fmt)
+    with sessionmanager.session(replica=replica, shard=sessionmanager.shard_for(user_id)) as db:
+        for rows in repository_contacts.stream_contacts(db, user_id, config.EXPORT_BATCH_SIZE):
+            yield _encode(rows, fmt)
+
+
+async def _export_async(user_id: int, fmt: str, replica: bool):
+    yield _header(fmt)
+    async with sessionmanager.async_session(replica=replica, shard=sessionmanager.shard_for(user_id)) as db:
+        async for rows in repository_contacts.stream_contacts_async(db, user_id, config.EXPORT_BATCH_SIZE):
+            yield _encode(rows, fmt)
+
+
+def export_contacts(user_id: int, fmt: str, replica: bool = False):
+    """
+    Returns the body iterator of the export. It opens its own session on the user's shard instead of using
+    the request one, because the stream outlives the request handler; ``replica`` reads from a read replica.
+    In sync mode it is a plain generator, which StreamingResponse iterates in the threadpool.
+    """
+    if sessionmanager.async_mode:
+        return _export_async(user_id, fmt, replica)
+    return _export_sync(user_id, fmt, replica)
@@ -0,0 +1,116 @@
+import csv
+import json
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.helpers import rollback
+from src.emtity.models import Users
+from src.repository import contacts as repository_contacts
+from src.schemas.contact import ContactCreate
+
+MAX_LINE_BYTES = 64 * 1024
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Splits a streamed request body into lines without ever holding more than one line
+    (bounded by MAX_LINE_BYTES) plus one network chunk in memory. Lines are yielded undecoded,
+    so a line that is not valid UTF-8 is reported as a failed row by the caller.
+    """
+    buffer = b''
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r')
+        if len(buffer) > MAX_LINE_BYTES:
+            raise LineTooLong(f'line longer than {MAX_LINE_BYTES} bytes')
+    if buffer:
+        yield buffer.rstrip(b'\r')
+
+
+def _error_messages(err: ValidationError) -> list[str]:
+    return [f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in err.errors()]
+
+
+class ContactsImport:
+    def __init__(self, fmt: str, db: AsyncSession | Session, user: Users,
+                 chunk_size: int = config.BULK_IMPORT_CHUNK_SIZE, max_errors: int = config.BULK_IMPORT_MAX_ERRORS):
+        self.fmt = fmt
+        self.db = db
+        self.user_id = user.id
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self._header: list[str] | None = None
+        self._chunk: list[ContactCreate] = []
+        self._chunk_rows: list[int] = []
+
+    def _fail(self, row: int, messages: list[str]):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "errors": messages})
+
+    def _parse(self, line: str) -> dict | None:
+        if self.fmt == 'ndjson':
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError('expected a JSON object')
+            return data
+        values = next(csv.reader([line]))
+        if self._header is None:
+            self._header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self._header):
+            raise ValueError(f'expected {len(self._header)} columns, got {len(values)}')
+        return {name: value or None for name, value in zip(self._header, values)}
+
+    async def _flush(self):
+        if not self._chunk:
+            return
+        try:
+            self.inserted += await repository_contacts.insert_contacts_async(self._chunk, self.db, self.user_id)
+        except SQLAlchemyError as err:
+            await rollback(self.db)
+            for row in self._chunk_rows:
+                self._fail(row, [f'database: {err.__class__.__name__}'])
+        self._chunk.clear()
+        self._chunk_rows.clear()
+
+    async def run(self, stream: AsyncIterator[bytes]) -> dict:
+        row = 0
+        try:
+            async for line in iter_lines(stream):
+                row += 1
+                if not line.strip():
+                    continue
+                try:
+                    # UnicodeDecodeError is a ValueError
+                    data = self._parse(line.decode('utf-8'))
+                    if data is None:
+                        continue
+                    self._chunk.append(ContactCreate.model_validate(data))
+                    self._chunk_rows.append(row)
+                except ValidationError as err:
+                    self._fail(row, _error_messages(err))
+                    continue
+                except (ValueError, csv.Error) as err:
+                    self._fail(row, [str(err)])
+                    continue
+                if len(self._chunk) >= self.chunk_size:
+                    await self._flush()
+        except LineTooLong as err:
+            self._fail(row + 1, [str(err)])
+        await self._flush()
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
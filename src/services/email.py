@@ -1,38 +1,77 @@
+import asyncio
+import logging
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
+from redis import asyncio as redis
+from redis.exceptions import RedisError
 
-from src.services.auth import auth_service
+from src.services.email_queue import EmailQueue
+from src.services.metrics import EMAILS
 from src.conf.config import config
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.MAIL_USERNAME,
-    MAIL_PASSWORD=config.MAIL_PASSWORD,
-    MAIL_FROM=config.MAIL_FROM,
-    MAIL_PORT=config.MAIL_PORT,
-    MAIL_SERVER=config.MAIL_SERVER,
-    MAIL_FROM_NAME="Fast API TEST",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+email_queue = EmailQueue()
+
+
+def smtp_options() -> dict:
+    return {
+        "hostname": config.MAIL_SERVER,
+        "port": config.MAIL_PORT,
+        "username": config.MAIL_USERNAME if config.MAIL_USE_CREDENTIALS else None,
+        "password": config.MAIL_PASSWORD if config.MAIL_USE_CREDENTIALS else None,
+        "use_tls": config.MAIL_SSL_TLS,
+        "start_tls": config.MAIL_STARTTLS,
+    }
 
 
 async def send_email(email: EmailStr, username: str, host: str):
+    """
+    Queues the confirmation email; the email workers render and send it.
+    The token is issued here so the workers do not need the JWT secret.
+    Without the queue the email is dropped, the user can ask for it again via /request_email.
+    """
+    # imported here: the email workers run this module and must not load the auth stack
+    from src.services.auth import auth_service
+
+    token_verification = auth_service.create_email_token({"sub": email})
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
+        if email_queue.redis is None:
+            raise RedisError("Email queue is not connected")
+        await email_queue.enqueue(
+            to=email,
             subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
+            template="email_template.html",
+            body={"host": host, "username": username, "token": token_verification},
         )
+    except RedisError as err:
+        EMAILS.labels("failed").inc()
+        print(err)
+
+
+async def run_workers():
+    """
+    Runs EMAIL_WORKERS workers in this process, each with its own SMTP connection, until cancelled.
+    Start it next to the web workers with ``python -m src.services.email``.
+    """
+    # imported here: the web workers import this module to queue emails and never send one
+    from src.services.email_worker import EmailWorker
+
+    r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0)
+    queue = EmailQueue(r)
+    workers = [
+        EmailWorker(queue, smtp_options(), sender=f"Fast API TEST <{config.MAIL_FROM}>",
+                    template_folder=TEMPLATE_FOLDER, batch_size=config.EMAIL_BATCH_SIZE,
+                    max_attempts=config.EMAIL_MAX_ATTEMPTS, backoff=config.EMAIL_RETRY_BACKOFF)
+        for _ in range(config.EMAIL_WORKERS)
+    ]
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        await r.aclose()
+
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+if __name__ == '__main__':
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(run_workers())
@@ -0,0 +1,107 @@
+"""
+Durable outbound email queue on Redis.
+
+The web workers only ``enqueue`` a job, which is a JSON document with the recipient, template and
+template variables. Jobs are delivered at least once:
+
+- a worker claims jobs with LMOVE into its own processing list and removes them only after the
+  mail server accepted the message;
+- a job that fails is parked in a sorted set scored by its next attempt time and moved back to the
+  queue when it is due; after ``max_attempts`` it goes to the dead list;
+- a worker that dies with claimed jobs stops refreshing its heartbeat key, and the next recovery
+  pass of any worker puts the jobs of its processing list back on the queue.
+
+The worker that sends the jobs is in src.services.email_worker, so that the web workers, which only
+enqueue, load neither the SMTP client nor the template engine.
+"""
+import json
+import random
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+
+class EmailQueue:
+    PREFIX = "email:"
+
+    def __init__(self, redis: Redis | None = None):
+        self.redis = redis
+        self.queue = f"{self.PREFIX}queue"
+        self.retry = f"{self.PREFIX}retry"
+        self.dead = f"{self.PREFIX}dead"
+
+    def processing(self, worker_id: str) -> str:
+        return f"{self.PREFIX}processing:{worker_id}"
+
+    def alive(self, worker_id: str) -> str:
+        return f"{self.PREFIX}alive:{worker_id}"
+
+    async def enqueue(self, to: str, subject: str, template: str, body: dict) -> str:
+        job = {"id": uuid.uuid4().hex, "to": to, "subject": subject, "template": template, "body": body,
+               "attempts": 0}
+        await self.redis.lpush(self.queue, json.dumps(job))
+        return job["id"]
+
+    async def claim(self, worker_id: str, batch_size: int, timeout: float) -> list[str]:
+        """
+        Waits up to ``timeout`` seconds for a job, then takes whatever else is already queued, up to
+        ``batch_size`` jobs in total.
+        """
+        processing = self.processing(worker_id)
+        first = await self.redis.blmove(self.queue, processing, timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        jobs = [first]
+        while len(jobs) < batch_size:
+            job = await self.redis.lmove(self.queue, processing, "RIGHT", "LEFT")
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    async def ack(self, worker_id: str, raw: str):
+        await self.redis.lrem(self.processing(worker_id), 1, raw)
+
+    async def fail(self, worker_id: str, raw: str, max_attempts: int, backoff: float) -> bool:
+        """
+        Schedules the next attempt with exponential backoff and jitter, or moves the job to the dead
+        list when it has no attempts left. Returns True when the job will be retried.
+        """
+        job = json.loads(raw)
+        job["attempts"] += 1
+        retried = job["attempts"] < max_attempts
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if retried:
+                delay = backoff * 2 ** (job["attempts"] - 1) * random.uniform(0.8, 1.2)
+                pipe.zadd(self.retry, {json.dumps(job): time.time() + delay})
+            else:
+                pipe.lpush(self.dead, json.dumps(job))
+            pipe.lrem(self.processing(worker_id), 1, raw)
+            await pipe.execute()
+        return retried
+
+    async def promote_due(self, limit: int = 100) -> int:
+        due = await self.redis.zrangebyscore(self.retry, "-inf", time.time(), start=0, num=limit)
+        moved = 0
+        for raw in due:
+            # only the worker whose ZREM succeeds requeues the job
+            if await self.redis.zrem(self.retry, raw):
+                await self.redis.lpush(self.queue, raw)
+                moved += 1
+        return moved
+
+    async def heartbeat(self, worker_id: str, ttl: int):
+        await self.redis.set(self.alive(worker_id), 1, ex=ttl)
+
+    async def recover(self) -> int:
+        """Puts the claimed jobs of workers whose heartbeat expired back on the queue."""
+        recovered = 0
+        async for key in self.redis.scan_iter(match=self.processing("*")):
+            key = key.decode() if isinstance(key, bytes) else key
+            worker_id = key[len(self.processing("")):]
+            if await self.redis.exists(self.alive(worker_id)):
+                continue
+            while await self.redis.lmove(key, self.queue, "RIGHT", "RIGHT") is not None:
+                recovered += 1
+        return recovered
@@ -0,0 +1,133 @@
+"""
+The worker that drains the email queue of src.services.email_queue.
+
+Each worker keeps one SMTP connection open across batches and reconnects when the server drops it.
+Only the email worker processes import this module, the web workers never render or send a message.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from email.message import EmailMessage
+from functools import lru_cache
+from pathlib import Path
+
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from redis.exceptions import RedisError
+
+from src.services.email_queue import EmailQueue
+from src.services.metrics import EMAILS
+
+logger = logging.getLogger("email")
+
+
+@lru_cache
+def template_environment(folder: str) -> Environment:
+    # One environment per process: templates are compiled once and reused for every message
+    return Environment(loader=FileSystemLoader(folder), autoescape=select_autoescape(["html"]),
+                       auto_reload=False)
+
+
+class EmailWorker:
+    HEARTBEAT_TTL = 30
+
+    def __init__(self, queue: EmailQueue, smtp_options: dict, sender: str, template_folder: str | Path,
+                 batch_size: int = 20, max_attempts: int = 5, backoff: float = 5, idle_timeout: float = 60):
+        self.queue = queue
+        self.smtp_options = smtp_options
+        self.sender = sender
+        self.templates = template_environment(str(template_folder))
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._smtp: aiosmtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._stopping = False
+
+    def render(self, job: dict) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = job["to"]
+        message["Subject"] = job["subject"]
+        message.set_content(self.templates.get_template(job["template"]).render(**job["body"]), subtype="html")
+        return message
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is not None and (not self._smtp.is_connected
+                                       or time.monotonic() - self._last_used > self.idle_timeout):
+            await self._disconnect()
+        if self._smtp is None:
+            smtp = aiosmtplib.SMTP(**self.smtp_options)
+            await smtp.connect()
+            self._smtp = smtp
+        self._last_used = time.monotonic()
+        return self._smtp
+
+    async def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+    async def _send(self, message: EmailMessage):
+        try:
+            await (await self._connection()).send_message(message)
+        except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError):
+            # a pooled connection the server already closed: one fresh attempt
+            await self._disconnect()
+            await (await self._connection()).send_message(message)
+
+    async def process_batch(self, timeout: float = 1) -> int:
+        """Claims one batch, sends it over the pooled connection and returns the number of jobs handled."""
+        jobs = await self.queue.claim(self.worker_id, self.batch_size, timeout)
+        for raw in jobs:
+            job = json.loads(raw)
+            try:
+                await self._send(self.render(job))
+            except Exception as err:  # one bad message must not take the rest of the batch down
+                if not isinstance(err, aiosmtplib.SMTPResponseException):
+                    # a refused message leaves the connection usable, anything else may not
+                    await self._disconnect()
+                retried = await self.queue.fail(self.worker_id, raw, self.max_attempts, self.backoff)
+                EMAILS.labels("retried" if retried else "dead").inc()
+                logger.warning("email %s to %s failed (attempt %s): %s", job["id"], job["to"],
+                               job["attempts"] + 1, err)
+                continue
+            await self.queue.ack(self.worker_id, raw)
+            EMAILS.labels("sent").inc()
+        return len(jobs)
+
+    async def _maintain(self):
+        while not self._stopping:
+            try:
+                await self.queue.heartbeat(self.worker_id, self.HEARTBEAT_TTL)
+                await self.queue.promote_due()
+                await self.queue.recover()
+            except RedisError as err:
+                logger.error("email queue unavailable: %s", err)
+            await asyncio.sleep(self.HEARTBEAT_TTL / 3)
+
+    async def run(self):
+        await self.queue.heartbeat(self.worker_id, self.HEARTBEAT_TTL)
+        maintenance = asyncio.create_task(self._maintain())
+        try:
+            while not self._stopping:
+                try:
+                    await self.process_batch()
+                except RedisError as err:
+                    logger.error("email queue unavailable: %s", err)
+                    await asyncio.sleep(1)
+        finally:
+            maintenance.cancel()
+            await self._disconnect()
+
+    def stop(self):
+        self._stopping = True
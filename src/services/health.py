@@ -0,0 +1,106 @@
+"""
+Dependency checks for the ``/livez`` and ``/readyz`` probes.
+
+A background task of each worker pings the dependencies every ``interval`` seconds, each ping bounded by
+``timeout``, and keeps the outcome in memory. The probes only read that outcome: however often they are
+called, they cost no connection, no pool checkout and no round trip.
+
+A worker is ready while every ``required`` check passed in the last round and that round is recent. A
+dependency that is checked but not required is reported and exported as a metric without taking the
+worker out of rotation: the app degrades without it (Redis, the mail server), and failing readiness on
+every pod at once would turn a degraded service into an outage. Until the first round completes the
+worker is not ready.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable
+
+from src.services.metrics import DEPENDENCY_UP
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[object]]
+
+
+async def tcp_ping(host: str, port: int):
+    """Opens and closes a TCP connection: enough to tell a server that accepts connections from one that does not."""
+    _, writer = await asyncio.open_connection(host, port)
+    writer.close()
+    await writer.wait_closed()
+
+
+class HealthMonitor:
+    def __init__(self, interval: float = 10, timeout: float = 2, required: Iterable[str] = ("database",),
+                 stale_after: float | None = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.required = set(required)
+        # a round that stopped completing (a stuck check, a dead task) must not keep the worker ready
+        self.stale_after = stale_after if stale_after is not None else 3 * interval + timeout
+        self.checks: dict[str, Check] = {}
+        self.results: dict[str, dict] = {}
+        self.checked_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _run_check(self, name: str, check: Check) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except Exception as err:
+            error = f"timed out after {self.timeout}s" if isinstance(err, asyncio.TimeoutError) else repr(err)
+            result = {"status": "down", "error": error}
+        else:
+            result = {"status": "up"}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    async def check(self):
+        """Runs every check once, concurrently, and publishes the results together."""
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(name, self.checks[name]) for name in names))
+        for name, result in zip(names, results):
+            previous = self.results.get(name, {}).get("status")
+            if result["status"] != previous and (previous or result["status"] == "down"):
+                logger.warning("%s is %s%s", name, result["status"],
+                               f": {result['error']}" if "error" in result else "")
+            DEPENDENCY_UP.labels(name).set(result["status"] == "up")
+        self.results = dict(zip(names, results))
+        self.checked_at = time.monotonic()
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("health check round failed")
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self, checks: dict[str, Check]):
+        self.checks = dict(checks)
+        self.results = {}
+        self.checked_at = None
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.stale_after:
+            return False
+        return all(self.results.get(name, {}).get("status") == "up" for name in self.required)
+
+    def snapshot(self) -> dict:
+        age = None if self.checked_at is None else round(time.monotonic() - self.checked_at, 3)
+        return {"status": "ready" if self.ready else "not ready", "checked_seconds_ago": age,
+                "checks": {name: {**result, "required": name in self.required}
+                           for name, result in self.results.items()}}
@@ -0,0 +1,32 @@
+from fastapi import Depends
+
+from src.conf.config import config
+from src.emtity.models import Users
+from src.services.auth import auth_service
+from src.services.rate_limit import CircuitBreaker, RateLimiter
+
+rate_limiter = RateLimiter(
+    fail_open=config.RATE_LIMIT_FAIL_OPEN,
+    timeout=config.RATE_LIMIT_REDIS_TIMEOUT,
+    breaker=CircuitBreaker(config.RATE_LIMIT_BREAKER_FAILURES, config.RATE_LIMIT_BREAKER_RESET),
+)
+
+
+async def current_user_id(user: Users = Depends(auth_service.get_current_user)) -> str:
+    # FastAPI resolves get_current_user once per request, the route reuses this lookup
+    return str(user.id)
+
+
+def rate_limit(route: str, default: str):
+    """
+    The rate_limit function returns the rate limit dependency of a route, counted per authenticated user.
+    The limit is written as "times/seconds"; RATE_LIMITS overrides it by route name, and its "*"
+    entry overrides the limits of all routes without an entry of their own.
+
+    :param route: str: Name of the route in RATE_LIMITS and in the metrics
+    :param default: str: Limit of the route when RATE_LIMITS has none
+    :return: The dependency, to be wrapped in Depends
+    :doc-author: Trelent
+    """
+    times, seconds = config.RATE_LIMITS.get(route, config.RATE_LIMITS.get("*", default)).split("/")
+    return Depends(rate_limiter.limit(route, int(times), float(seconds), identify=current_user_id))
@@ -0,0 +1,101 @@
+"""
+Prometheus metrics of the app, scraped from ``/metrics``.
+
+With several workers every process has its own counters, so a scrape that lands on one worker would
+only see a share of the traffic. Set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory, shared by
+all workers and wiped before they start. prometheus_client then keeps the values in memory-mapped
+files in that directory, and ``/metrics`` aggregates the files of all workers.
+"""
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to the last byte of the response",
+                            ["method", "route"])
+POOL_SIZE = Gauge("db_pool_size", "Connections the pools keep open", multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", multiprocess_mode="livesum")
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time requests waited for a connection",
+                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection")
+RATE_LIMITED = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["route"])
+EMAILS = Counter("emails_total", "Emails handed to the mail server by outcome", ["outcome"])
+# with several workers a dependency counts as down as soon as one of them cannot reach it
+DEPENDENCY_UP = Gauge("dependency_up", "1 when the last background check of a dependency passed", ["dependency"],
+                      multiprocess_mode="livemin")
+
+
+def _route(scope: Scope) -> str:
+    # the route template, never the raw path, keeps the number of series bounded
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = _route(scope)
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+            REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+
+
+def instrument_pool(engine):
+    """
+    Keeps the pool gauges of this process current. Only queue pools are instrumented, SQLite's pools
+    have nothing to report.
+    """
+    # imported here: the email workers count emails through this module and have no database
+    from sqlalchemy import event
+
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+
+    def update(returning: int = 0):
+        current = engine.pool
+        POOL_SIZE.set(current.size())
+        POOL_CHECKED_OUT.set(current.checkedout() - returning)
+        POOL_OVERFLOW.set(max(current.overflow(), 0))
+
+    event.listen(engine, "checkout", lambda *args: update())
+    # checkin fires before the connection is back in the pool
+    event.listen(engine, "checkin", lambda *args: update(returning=1))
+    update()
+
+
+def render() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def shutdown():
+    # drops the live gauges of this worker from the aggregate
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
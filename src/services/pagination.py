@@ -0,0 +1,20 @@
+import base64
+import json
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(contact_id: int) -> str:
+    raw = json.dumps({"id": contact_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        contact_id = json.loads(raw)["id"]
+        if not isinstance(contact_id, int):
+            raise ValueError(cursor)
+        return contact_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
@@ -0,0 +1,19 @@
+from functools import lru_cache
+
+
+# These functions run inside the password-hashing worker processes, so the module imports nothing
+# from the application: a spawned worker only needs passlib. passlib itself is imported on first use,
+# the web process only refers to these functions and never hashes.
+
+@lru_cache
+def _context(rounds: int):
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_and_update(password: str, hashed_password: str, rounds: int) -> tuple[bool, str | None]:
+    return _context(rounds).verify_and_update(password, hashed_password)
@@ -0,0 +1,206 @@
+"""
+Rate limiting with a sliding window shared through Redis and a per-process fast path.
+
+A request is checked in three steps:
+
+- the key's local token bucket, sized like the limit, rejects locally once this process alone has
+  used up the limit; the bucket refills continuously, so it never rejects a request the shared window
+  would allow;
+- a key that Redis rejected stays rejected locally until its retry time, so clients that keep
+  hammering a limited route do not cost a round trip each;
+- everything else is decided by one EVALSHA of a sliding-window log script, atomic across workers.
+
+Redis calls are bounded by ``timeout`` and go through a circuit breaker. While Redis is failing, the
+limiter lets requests through with only the local buckets as a limit (``fail_open``) or rejects them
+with 503.
+"""
+import asyncio
+import math
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.services.metrics import RATE_LIMITED
+from src.services.timing import phase
+
+SLIDING_WINDOW = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return math.max(1, tonumber(oldest[2]) + window - now)
+"""
+
+
+class LimiterUnavailable(Exception):
+    pass
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "blocked_until")
+
+    def __init__(self, capacity: int, seconds: float, now: float):
+        self.capacity = capacity
+        self.rate = capacity / seconds
+        self.tokens = float(capacity)
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def take(self, now: float) -> float:
+        """Takes a token and returns 0, or returns the seconds until the next token."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. Once ``reset_timeout`` seconds passed, a
+    single probe is let through: its success closes the breaker, its failure opens it again.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release(self):
+        """Ends a probe that neither succeeded nor failed, so that the next request probes instead."""
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+def client_address(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    PREFIX = "ratelimit:"
+
+    def __init__(self, redis: Redis | None = None, fail_open: bool = True, timeout: float = 0.05,
+                 breaker: CircuitBreaker | None = None, max_local_keys: int = 100000):
+        self.redis = redis
+        self.fail_open = fail_open
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.max_local_keys = max_local_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._script = None
+        self._script_redis = None
+
+    def _bucket(self, key: str, times: int, seconds: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(times, seconds, now)
+            while len(self._buckets) > self.max_local_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _sliding_window(self):
+        # Script objects run EVALSHA and load the script on NOSCRIPT
+        if self._script is None or self._script_redis is not self.redis:
+            self._script = self.redis.register_script(SLIDING_WINDOW)
+            self._script_redis = self.redis
+        return self._script
+
+    def _unavailable(self) -> float:
+        if self.fail_open:
+            return 0.0
+        raise LimiterUnavailable("Rate limiter storage is unavailable")
+
+    async def hit(self, key: str, times: int, seconds: float) -> float:
+        """
+        Counts one request against ``times`` per ``seconds`` for the key. Returns 0 when the request
+        is allowed, otherwise the seconds until it would be. Raises LimiterUnavailable when Redis
+        cannot be reached and the limiter fails closed.
+        """
+        now = time.monotonic()
+        bucket = self._bucket(key, times, seconds, now)
+        if bucket.blocked_until > now:
+            return bucket.blocked_until - now
+        retry_after = bucket.take(now)
+        if retry_after:
+            return retry_after
+        if self.redis is None or not self.breaker.allow():
+            return self._unavailable()
+
+        window = int(seconds * 1000)
+        now_ms = int(time.time() * 1000)
+        try:
+            retry_ms = await asyncio.wait_for(
+                self._sliding_window()(keys=[self.PREFIX + key], args=[now_ms, window, times, uuid.uuid4().hex]),
+                self.timeout,
+            )
+        except (RedisError, OSError, asyncio.TimeoutError):
+            self.breaker.failure()
+            return self._unavailable()
+        except BaseException:
+            # a cancelled request (the client went away) says nothing about Redis, but a probe left
+            # pending would keep the breaker from ever closing again
+            self.breaker.release()
+            raise
+        self.breaker.success()
+        if retry_ms:
+            bucket.blocked_until = now + retry_ms / 1000
+            return retry_ms / 1000
+        return 0.0
+
+    def limit(self, route: str, times: int, seconds: float, identify: Callable = client_address):
+        """
+        Returns a dependency that allows ``times`` requests per ``seconds`` to ``route`` for each
+        identity, which is what the ``identify`` dependency returns (the client address by default).
+        """
+        async def rate_limit(identity: str = Depends(identify)):
+            try:
+                with phase("ratelimit"):
+                    retry_after = await self.hit(f"{route}:{identity}", times, seconds)
+            except LimiterUnavailable:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Rate limiter unavailable", headers={"Retry-After": "1"})
+            if retry_after:
+                RATE_LIMITED.labels(route).inc()
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                    headers={"Retry-After": str(math.ceil(retry_after))})
+
+        return rate_limit
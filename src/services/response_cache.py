@@ -0,0 +1,104 @@
+import hashlib
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.services.serialization import negotiate
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized contact read responses, keyed per user and request.
+
+    Every key embeds the user's generation counter, which ``bump`` increments after each write, so a
+    write makes all earlier entries of that user unreachable at once (they expire on their TTL).
+    The ETag is derived from the same generation: answering ``If-None-Match`` needs one Redis GET and
+    neither a database query nor serialization.
+
+    The body format is negotiated from Accept before anything else, and JSON and MessagePack bodies
+    of the same request are cached and tagged separately.
+
+    A bump that fails leaves the user's old ETags valid, and nothing would ever invalidate them. So the
+    user is kept as pending and the bump is retried before every later call of this worker. Until it goes
+    through, this worker serves that user's responses without ETag and without the cache.
+
+    A bump also marks the user's write as recent for ``replica_lag`` seconds, the read-your-writes window.
+    Reads are normally pinned to the primary for that long, but the pin can be missed, e.g. when setting
+    it failed. A body built from a replica (``request.state.replica_read``) during that window may
+    predate the write, so it is neither cached nor tagged under the new generation.
+    """
+    PREFIX = "contacts:"
+
+    def __init__(self, ttl: int, replica_lag: float = 0):
+        self.ttl = ttl
+        self.replica_lag_ms = int(replica_lag * 1000)
+        self.redis: Redis | None = None
+        self._pending: set[int] = set()
+
+    def _generation_key(self, user_id: int) -> str:
+        return f"{self.PREFIX}gen:{user_id}"
+
+    def _recent_key(self, user_id: int) -> str:
+        return f"{self.PREFIX}recent:{user_id}"
+
+    async def bump(self, user_id: int):
+        if self.redis is None:
+            return
+        self._pending.add(user_id)
+        await self._retry_bumps()
+
+    async def _retry_bumps(self):
+        for user_id in list(self._pending):
+            pipe = self.redis.pipeline()
+            pipe.incr(self._generation_key(user_id))
+            if self.replica_lag_ms:
+                pipe.set(self._recent_key(user_id), 1, px=self.replica_lag_ms)
+            try:
+                await pipe.execute()
+            except RedisError:
+                return
+            self._pending.discard(user_id)
+
+    async def respond(self, request: Request, user_id: int,
+                      build: Callable[[str], Awaitable[bytes]]) -> Response:
+        """
+        Returns 304 when the client already has the current version, the cached body when there is
+        one, and otherwise the body produced by ``build`` for the negotiated media type, which is
+        cached on the way out unless it was read from a replica right after a write.
+        """
+        media_type = negotiate(request)
+        if self._pending and self.redis is not None:
+            await self._retry_bumps()
+        if self.redis is None or user_id in self._pending:
+            return Response(content=await build(media_type), media_type=media_type, headers={"Vary": "Accept"})
+        try:
+            generation, recent = await self.redis.mget(self._generation_key(user_id), self._recent_key(user_id))
+        except RedisError:
+            return Response(content=await build(media_type), media_type=media_type, headers={"Vary": "Accept"})
+
+        generation = int(generation or 0)
+        digest = hashlib.sha1(
+            f"{media_type} {request.url.path}?{sorted(request.query_params.multi_items())}".encode()
+        ).hexdigest()[:16]
+        etag = f'W/"{user_id}.{generation}.{digest}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+        if etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        body_key = f"{self.PREFIX}resp:{user_id}:{generation}:{digest}"
+        try:
+            body = await self.redis.get(body_key)
+        except RedisError:
+            body = None
+        if body is None:
+            body = await build(media_type)
+            if recent is not None and getattr(request.state, "replica_read", False):
+                return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+            try:
+                await self.redis.set(body_key, body, ex=self.ttl)
+            except RedisError:
+                pass
+        return Response(content=body, media_type=media_type, headers=headers)
+
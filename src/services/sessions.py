@@ -0,0 +1,60 @@
+"""
+Refresh-token sessions in Redis.
+
+Every login opens a session of its own, so each device of a user rotates its refresh tokens
+independently. A session key holds the id (``jti``) of the only refresh token that may be used next
+and expires together with that token. Rotation is one atomic script: the presented token must be the
+current one, and presenting an older token of the session is treated as theft, which ends the session.
+"""
+import uuid
+
+from redis.asyncio import Redis
+
+ROTATE = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return 0
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return -1
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+ROTATED, MISSING, REUSED = 1, 0, -1
+
+
+class SessionStore:
+    PREFIX = "session:"
+
+    def __init__(self, redis: Redis | None = None):
+        self.redis = redis
+        self._script = None
+        self._script_redis = None
+
+    def _key(self, sid: str) -> str:
+        return f"{self.PREFIX}{sid}"
+
+    async def create(self, ttl: int) -> tuple[str, str]:
+        """Opens a session and returns its id with the id of its first refresh token."""
+        sid, jti = uuid.uuid4().hex, uuid.uuid4().hex
+        await self.redis.set(self._key(sid), jti, ex=ttl)
+        return sid, jti
+
+    async def rotate(self, sid: str, jti: str, ttl: int) -> tuple[int, str | None]:
+        """
+        Replaces the current token ``jti`` of the session with a new one. Returns ROTATED and the new
+        token id, MISSING when the session expired or was revoked, or REUSED when ``jti`` is an older
+        token of the session, which is revoked then.
+        """
+        if self._script is None or self._script_redis is not self.redis:
+            self._script = self.redis.register_script(ROTATE)
+            self._script_redis = self.redis
+        new_jti = uuid.uuid4().hex
+        result = int(await self._script(keys=[self._key(sid)], args=[jti, new_jti, ttl]))
+        return result, new_jti if result == ROTATED else None
+
+
+session_store = SessionStore()
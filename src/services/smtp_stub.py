@@ -0,0 +1,94 @@
+"""
+A local stand-in for the mail server: an in-process SMTP server without TLS or authentication
+that keeps every accepted message in memory.
+
+It understands the commands aiosmtplib sends (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT). It can
+also be told to reject the next messages, so tests can exercise retries.
+
+Run it for local development and point the app at it with MAIL_SERVER=127.0.0.1 MAIL_PORT=1025
+MAIL_SSL_TLS=false MAIL_USE_CREDENTIALS=false::
+
+    python -m src.services.smtp_stub --port 1025
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+from email.message import Message
+
+
+class LocalSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.messages: list[Message] = []
+        self.connections = 0
+        self.reject_next = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 localhost SMTP stand-in")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                if command == "EHLO":
+                    await reply("250-localhost")
+                    await reply("250 8BITMIME")
+                elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while (chunk := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        data += chunk[1:] if chunk.startswith(b"..") else chunk
+                    if self.reject_next:
+                        self.reject_next -= 1
+                        await reply("451 Try again later")
+                    else:
+                        self.messages.append(message_from_bytes(bytes(data)))
+                        await reply("250 OK: queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+
+async def main(args):
+    async with LocalSMTPServer(args.host, args.port) as server:
+        print(f"SMTP stand-in listening on {server.host}:{server.port}")
+        seen = 0
+        while True:
+            await asyncio.sleep(0.5)
+            for message in server.messages[seen:]:
+                print(f"--- {message['To']}: {message['Subject']}")
+            seen = len(server.messages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,176 @@
+import cProfile
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Collection
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # profiling falls back to cProfile
+    Profiler = None
+
+logger = logging.getLogger("timing")
+
+
+class RequestTimings:
+    """
+    Time spent per phase of one request. Phases may overlap: ``user`` includes the ``db`` time of the
+    user lookup, ``total`` includes everything.
+    """
+    __slots__ = ("phases", "queries")
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.queries = 0
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        items = []
+        for name, seconds in self.phases.items():
+            item = f"{name};dur={seconds * 1000:.2f}"
+            if name == "db":
+                item += f';desc="{self.queries} queries"'
+            items.append(item)
+        items.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(items)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.add("db", time.perf_counter() - started)
+        timings.queries += 1
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """
+    Adds the time of every statement to the ``db`` phase of the request that runs it. Statements of
+    sync sessions run in the threadpool and those of async sessions in a greenlet; both see the
+    request's context, so the hooks find its timings.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class _Profile:
+    # pyinstrument samples and follows the request across awaits; cProfile traces every call on the
+    # event loop, other requests included
+    def __init__(self, directory: Path, scope: Scope):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        suffix = "pyisession" if Profiler is not None else "prof"
+        self.path = directory / f"{int(time.time() * 1000)}-{scope['method']}-{slug}.{suffix}"
+        self.profiler = Profiler(async_mode="enabled") if Profiler is not None else cProfile.Profile()
+
+    def start(self):
+        if Profiler is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if Profiler is not None:
+            self.profiler.stop()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.profiler.last_session.save(str(self.path))
+        else:
+            self.profiler.disable()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.profiler.dump_stats(self.path)
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the phases of each request into a ``Server-Timing`` header and logs them as one JSON line
+    on the ``timing`` logger once the response is sent.
+
+    When ``profile_dir`` is set, a request with ``X-Profile: 1`` is also profiled; the profile is saved
+    to that directory and its file name returned in the ``X-Profile`` response header.
+
+    Requests to ``skip_paths`` are passed through untimed and unlogged, so frequent probes do not flood the log.
+    """
+    def __init__(self, app: ASGIApp, profile_dir: str | None = None, skip_paths: Collection[str] = ()):
+        self.app = app
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        finished = None
+        status_code = 500
+        profile = None
+        if self.profile_dir is not None and (b"x-profile", b"1") in scope["headers"]:
+            profile = _Profile(self.profile_dir, scope)
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing(time.perf_counter() - started))
+                if profile is not None:
+                    headers.append("X-Profile", profile.path.name)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = time.perf_counter()
+            await send(message)
+
+        if profile is not None:
+            profile.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profile is not None:
+                profile.stop()
+            _current.reset(token)
+            # background tasks run after the body is sent and are not billed to the request
+            total = (finished or time.perf_counter()) - started
+            logger.info(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "total_ms": round(total * 1000, 2),
+                **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in timings.phases.items()},
+                "db_queries": timings.queries,
+            }))
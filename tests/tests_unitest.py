@@ -1,19 +1,55 @@
+import asyncio
+import os
+import re
+import tempfile
 import unittest
 from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-from sqlalchemy import create_engine
+# Обязательные настройки для модулей приложения, которые читают конфигурацию при импорте
+for name, value in {"DB_URL": "sqlite://", "SECRET_KEY_JWT": "secret", "ALGORITHM": "HS256",
+                    "MAIL_USERNAME": "user", "MAIL_PASSWORD": "password", "MAIL_FROM": "noreply@example.com",
+                    "MAIL_PORT": "465", "MAIL_SERVER": "localhost", "REDIS_HOST": "localhost",
+                    "REDIS_PORT": "6379"}.items():
+    os.environ.setdefault(name, value)
+
+import fakeredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from starlette.requests import Request
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import sessionmaker
-from src.emtity.models import Base, Users, Contact
+from sqlalchemy.schema import CreateTable
+from src.database import db as database, replicas
+from src.database.db import DatabaseSessionManager
+from src.database.shards import ShardMap
+from src.emtity.models import Base, Users, Contact, UserDirectory
+from src.repository import users as repository_users
 from src.repository.contacts import (
     get_contacts,
     get_contact,
     create_contact,
+    insert_contacts,
+    stream_contacts,
     update_contact,
+    update_contacts,
     delete_contact,
+    delete_contacts,
+    get_contacts_by_ids,
     search_contact,
     upcoming_birthdays,
 )
-from src.schemas.contact import ContactCreate
+from src.schemas.contact import ContactCreate, ContactUpdate
+from src.schemas.users import UserSchema
+from src.services.email_queue import EmailQueue
+from src.services.email_worker import EmailWorker
+from src.services.health import HealthMonitor
+from src.services.response_cache import ResponseCache
+from src.services.rate_limit import CircuitBreaker, LimiterUnavailable, RateLimiter
+from src.services.sessions import SessionStore, ROTATED, MISSING, REUSED
+from src.services.smtp_stub import LocalSMTPServer
 
 
 class TestApiFunctions(unittest.TestCase):
@@ -32,7 +68,7 @@ class TestApiFunctions(unittest.TestCase):
 
     def test_get_contacts(self):
         # Создаем фиктивного пользователя для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         self.db.add(user)
 
         # Создаем несколько контактов для пользователя
@@ -44,9 +80,205 @@ class TestApiFunctions(unittest.TestCase):
         retrieved_contacts = get_contacts(limit=10, offset=0, db=self.db, user=user)
         self.assertEqual(len(retrieved_contacts), 5)
 
+    def test_get_contacts_after_cursor(self):
+        # Создаем пользователя с несколькими контактами и читаем их страницами по курсору
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        self.db.add(user)
+        self.db.add_all([Contact(user=user) for _ in range(5)])
+        self.db.commit()
+
+        first_page = get_contacts(limit=2, offset=0, db=self.db, user=user)
+        second_page = get_contacts(limit=2, offset=100, db=self.db, user=user, after=first_page[-1].id)
+        self.assertEqual([contact.id for contact in first_page], [1, 2])
+        self.assertEqual([contact.id for contact in second_page], [3, 4])
+
+    def test_get_contacts_skips_identity_map(self):
+        # Список контактов читается одним запросом без users и без ORM-объектов в сессии
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        self.db.add(user)
+        self.db.add_all([Contact(first_name=f"John{i}", user=user) for i in range(3)])
+        self.db.commit()
+        self.db.expunge_all()
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        retrieved_contacts = get_contacts(limit=10, offset=0, db=self.db, user=Users(id=1))
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('users', statements[0])
+        self.assertEqual(len(self.db.identity_map), 0)
+        self.assertEqual(retrieved_contacts[0].first_name, "John0")
+
+    def test_bulk_contacts(self):
+        # Пакетные операции выполняются одним запросом и не трогают контакты другого пользователя
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        other = Users(id=2, username='other_user', email='other_user@example.com', password='hash')
+        self.db.add_all([user, other])
+        self.db.add_all([Contact(id=i, first_name=f"John{i}", user=user) for i in (1, 2, 3)] + [Contact(id=4, user=other)])
+        self.db.commit()
+
+        user = Users(id=1)
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        found = get_contacts_by_ids([3, 1, 4, 99], db=self.db, user=user)
+        updated = update_contacts([1, 2, 4], ContactUpdate(last_name="Smith", birthday="1990-03-04"), db=self.db, user=user)
+        deleted = delete_contacts([2, 3, 4], db=self.db, user=user)
+
+        self.assertEqual(len(statements), 3)
+        self.assertEqual([c.id for c in found], [1, 3])
+        self.assertEqual(sorted((c.id, c.last_name) for c in updated), [(1, "Smith"), (2, "Smith")])
+        self.assertEqual(sorted(deleted), [2, 3])
+        self.assertEqual(self.db.query(Contact.birthday_md).filter_by(id=1).scalar(), 304)
+        self.assertEqual(sorted(self.db.scalars(select(Contact.id))), [1, 4])
+
+    def test_writes_are_single_statements(self):
+        # Без expire_on_commit создание и изменение контакта — ровно один запрос, без перечитывания после commit
+        self.db.add(Users(id=1, username='test_user', email='test_user@example.com', password='hash'))
+        self.db.commit()
+        db = sessionmaker(bind=self.engine, expire_on_commit=False)()
+        user = Users(id=1)
+        body = ContactCreate(first_name="John", last_name="Doe", email="john@example.com",
+                             phone_number="380501234567", birthday="1990-01-01")
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        created = create_contact(body=body, db=db, user=user)
+        self.assertEqual((created.id, created.first_name), (1, "John"))
+        self.assertIsNotNone(created.created_at)
+        self.assertIn('RETURNING', statements[0])
+        updated = update_contact(contact_id=created.id, body=body.model_copy(update={"first_name": "Jim"}),
+                                 db=db, user=user)
+        self.assertEqual(updated.first_name, "Jim")
+        self.assertEqual(len(statements), 2)
+        db.close()
+
+    def test_contacts_partition_key(self):
+        # Таблица секционируется по user_id в Postgres, а изменения через ORM всегда фильтруют по user_id
+        ddl = str(CreateTable(Contact.__table__).compile(dialect=postgresql.dialect()))
+        self.assertIn('PARTITION BY HASH (user_id)', ddl)
+        self.assertNotIn('PRIMARY KEY', ddl)
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        contact = Contact(first_name="John", user=user)
+        self.db.add(contact)
+        self.db.commit()
+        self.assertEqual(contact.id, 1)
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        contact.first_name = "Jim"
+        self.db.flush()
+        self.db.delete(contact)
+        self.db.flush()
+        self.assertEqual(len(statements), 2)
+        for statement in statements:
+            self.assertIn('contacts.user_id = ?', statement)
+
+    def test_shards(self):
+        # Пользователи и их контакты распределяются по нескольким базам SQLite, заменяющим шарды
+        shard_map = ShardMap(3)
+        engines = [create_engine('sqlite:///:memory:') for _ in range(3)]
+        shards = []
+        for engine in engines:
+            Base.metadata.create_all(engine)
+            shards.append(sessionmaker(bind=engine)())
+        for user_id in range(1, 31):
+            db = shards[shard_map.shard_for(user_id)]
+            user = Users(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.com', password='hash')
+            db.add_all([user, Contact(first_name=f"John{user_id}", user=user)])
+            db.commit()
+
+        self.assertEqual({shard_map.shard_for(user_id) for user_id in range(1, 31)}, {0, 1, 2})
+        for user_id in range(1, 31):
+            found = [sum(map(len, stream_contacts(db=db, user_id=user_id))) for db in shards]
+            self.assertEqual(found[shard_map.shard_for(user_id)], 1)
+            self.assertEqual(sum(found), 1)
+
+        # Новый шард забирает только часть пользователей, остальные остаются на месте
+        moved = [user_id for user_id in range(1, 1001) if ShardMap(4).shard_for(user_id) != shard_map.shard_for(user_id)]
+        self.assertLess(len(moved), 400)
+        self.assertTrue(all(ShardMap(4).shard_for(user_id) == 3 for user_id in moved))
+        self.assertEqual(ShardMap(1).shard_for(42), 0)
+        for db, engine in zip(shards, engines):
+            db.close()
+            engine.dispose()
+
+    def test_shard_routing(self):
+        # Справочник на основной базе выдает id, по нему пользователь создается, читается и пишется на своем шарде
+        directory = tempfile.TemporaryDirectory()
+        urls = [f"sqlite:///{directory.name}/shard{shard}.db" for shard in range(3)]
+        for url in urls:
+            engine = create_engine(url)
+            Base.metadata.create_all(engine)
+            engine.dispose()
+        manager = DatabaseSessionManager(urls[0], shard_urls=urls[1:])
+        patches = [mock.patch.object(module, "sessionmanager", manager)
+                   for module in (database, replicas, repository_users)]
+
+        def database_of(session):
+            return Path(session.get_bind().url.database).name
+
+        async def dependency(generator):
+            session = await generator.__anext__()
+            name = database_of(session)
+            await generator.aclose()
+            return name
+
+        async def scenario():
+            placed = {}
+            with manager.session() as primary:
+                for i in range(1, 31):
+                    body = UserSchema(username=f"user{i}", email=f"user{i}@example.com", password="secret")
+                    user = await repository_users.create_user_async(body, primary)
+                    shard = await repository_users.get_shard_async(body.email, primary)
+                    found = await repository_users.get_user_by_email_async(body.email, primary)
+                    read = await dependency(replicas.get_read_session(Request({"type": "http"}), user, primary))
+                    write = await dependency(replicas.get_user_session(user, primary))
+                    placed[user.id] = (shard, found.id, read, write)
+                unknown = await repository_users.get_shard_async("nobody@example.com", primary)
+
+                # Пользователь, которого не удалось создать на шарде, освобождает свой email в справочнике
+                with manager.session(shard=2) as session:
+                    session.connection().exec_driver_sql("DROP TABLE contacts")
+                    session.connection().exec_driver_sql("DROP TABLE users")
+                failed = None
+                for i in range(31, 60):
+                    body = UserSchema(username=f"user{i}", email=f"user{i}@example.com", password="secret")
+                    try:
+                        await repository_users.create_user_async(body, primary)
+                    except Exception:
+                        failed = body.email
+                        break
+                directory_emails = set(primary.scalars(select(UserDirectory.email)))
+            await manager.close()
+            return placed, unknown, failed, directory_emails
+
+        with patches[0], patches[1], patches[2]:
+            placed, unknown, failed, directory_emails = asyncio.run(scenario())
+        directory.cleanup()
+
+        self.assertEqual({shard for shard, *_ in placed.values()}, {0, 1, 2})
+        for user_id, (shard, found_id, read, write) in placed.items():
+            self.assertEqual(shard, manager.shard_for(user_id))
+            self.assertEqual(found_id, user_id)
+            self.assertEqual((read, write), (f"shard{shard}.db", f"shard{shard}.db"))
+        self.assertIsNone(unknown)
+        self.assertIsNotNone(failed)
+        self.assertNotIn(failed, directory_emails)
+        self.assertIn("user1@example.com", directory_emails)
+
+    def test_stream_contacts(self):
+        # Проверяем, что экспорт отдает все контакты пользователя пачками заданного размера
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        self.db.add(user)
+        self.db.add_all([Contact(first_name=f"John{i}", user=user) for i in range(5)])
+        self.db.commit()
+
+        batches = list(stream_contacts(db=self.db, user_id=1, batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[0][0].first_name, "John0")
+
     def test_get_contact(self):
         # Создаем фиктивного пользователя и контакт для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         contact = Contact(id=1, user=user)
         self.db.add_all([user, contact])
         self.db.commit()
@@ -59,7 +291,7 @@ class TestApiFunctions(unittest.TestCase):
 
     def test_create_contact(self):
         # Создаем фиктивного пользователя для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         self.db.add(user)
         self.db.commit()
 
@@ -67,7 +299,9 @@ class TestApiFunctions(unittest.TestCase):
         contact_data = {
             "first_name": "John",
             "last_name": "Doe",
-            "email": "john@example.com"
+            "email": "john@example.com",
+            "phone_number": "380501234567",
+            "birthday": "1990-01-01",
         }
         contact_create = ContactCreate(**contact_data)
 
@@ -76,10 +310,52 @@ class TestApiFunctions(unittest.TestCase):
         self.assertEqual(created_contact.first_name, "John")
         self.assertEqual(created_contact.last_name, "Doe")
 
+    def test_insert_contacts(self):
+        # Проверяем пакетную вставку контактов одним запросом
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        self.db.add(user)
+        self.db.commit()
+
+        bodies = [ContactCreate(first_name=f"John{i}", last_name="Doe", email=f"john{i}@example.com",
+                                phone_number="380501234567", birthday="1990-12-31") for i in range(3)]
+        self.assertEqual(insert_contacts(bodies=bodies, db=self.db, user_id=1), 3)
+
+        contacts = self.db.query(Contact).filter_by(user_id=1).all()
+        self.assertEqual(len(contacts), 3)
+        self.assertTrue(all(contact.birthday_md == 1231 for contact in contacts))
+
+    def test_insert_contacts_empty_fields(self):
+        # Пустая строка и NULL сохраняются одинаково и через INSERT, и через COPY
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        self.db.add(user)
+        self.db.commit()
+        body = ContactCreate(first_name="John", last_name="Doe", email="john@example.com", phone_number="",
+                             birthday="1990-12-31", additional_data=None)
+
+        insert_contacts(bodies=[body], db=self.db, user_id=1)
+        inserted = self.db.query(Contact.phone_number, Contact.additional_data).filter_by(user_id=1).one()
+
+        # COPY через psycopg2: перехватываем запрос и поток и читаем его по правилам CSV формата COPY,
+        # где только поле без кавычек, равное маркеру NULL, становится NULL
+        session = mock.MagicMock()
+        session.get_bind.return_value.dialect.driver = 'psycopg2'
+        cursor = session.connection.return_value.connection.cursor.return_value
+        insert_contacts(bodies=[body], db=session, user_id=1)
+        sql, stream = cursor.copy_expert.call_args.args
+        self.assertIn("NULL '\\N'", sql)
+        fields = re.findall(r'\\N|"(?:[^"]|"")*"', stream.read().rstrip('\n'))
+        copied = dict(zip(re.search(r'\((.*)\)', sql.split('FROM')[0]).group(1).split(', '),
+                          [None if field == '\\N' else field[1:-1].replace('""', '"') for field in fields]))
+
+        self.assertEqual(len(fields), len(copied))
+        self.assertEqual(tuple(inserted), ("", None))
+        self.assertEqual((copied['phone_number'], copied['additional_data']), tuple(inserted))
+        self.assertEqual(copied['first_name'], "John")
+
     # Также добавьте тесты для update_contact, delete_contact, search_contact и upcoming_birthdays
     def test_update_contact(self):
         # Создаем фиктивного пользователя и контакт для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         contact = Contact(id=1, user=user)
         self.db.add_all([user, contact])
         self.db.commit()
@@ -88,7 +364,9 @@ class TestApiFunctions(unittest.TestCase):
         updated_data = {
             "first_name": "UpdatedJohn",
             "last_name": "UpdatedDoe",
-            "email": "updatedjohn@example.com"
+            "email": "updatedjohn@example.com",
+            "phone_number": "380501234567",
+            "birthday": "1990-01-01",
         }
         updated_contact = ContactCreate(**updated_data)
 
@@ -99,7 +377,7 @@ class TestApiFunctions(unittest.TestCase):
 
     def test_delete_contact(self):
         # Создаем фиктивного пользователя и контакт для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         contact = Contact(id=1, user=user)
         self.db.add_all([user, contact])
         self.db.commit()
@@ -116,7 +394,7 @@ class TestApiFunctions(unittest.TestCase):
 
     def test_search_contact(self):
         # Создаем фиктивного пользователя и несколько контактов для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         contacts = [
             Contact(first_name="John", last_name="Doe", email="john@example.com", user=user),
             Contact(first_name="Jane", last_name="Doe", email="jane@example.com", user=user),
@@ -135,9 +413,20 @@ class TestApiFunctions(unittest.TestCase):
         self.assertTrue(all(
             contact.email == "john@example.com" or contact.email == "jane@example.com" for contact in search_result))
 
+    def test_search_contact_limit(self):
+        # Проверяем ограничение количества результатов и поиск по короткому запросу
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        contacts = [Contact(first_name=f"John{i}", last_name="Doe", email=f"john{i}@example.com", user=user)
+                    for i in range(5)]
+        self.db.add_all([user] + contacts)
+        self.db.commit()
+
+        self.assertEqual(len(search_contact(query="Doe", db=self.db, user=user, limit=3)), 3)
+        self.assertEqual(len(search_contact(query="Do", db=self.db, user=user)), 5)
+
     def test_upcoming_birthdays(self):
         # Создаем фиктивного пользователя и несколько контактов с днями рождения для теста
-        user = Users(id=1, username='test_user')
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
         today = datetime.now().date()
         contacts = [
             Contact(first_name="John", last_name="Doe", email="john@example.com", user=user,
@@ -159,6 +448,262 @@ class TestApiFunctions(unittest.TestCase):
         # Проверяем, что контакты возвращаются в правильной последовательности по датам дней рождения
         self.assertTrue(upcoming_bdays[0].birthday < upcoming_bdays[1].birthday)
 
+    def test_upcoming_birthdays_recurring(self):
+        # Дни рождения повторяются каждый год: год рождения не важен, окно задается параметром days
+        user = Users(id=1, username='test_user', email='test_user@example.com', password='hash')
+        today = datetime.now().date()
+        contacts = [
+            Contact(first_name="John", user=user, birthday=(today + timedelta(days=3)).replace(year=1980)),
+            Contact(first_name="Jane", user=user, birthday=(today + timedelta(days=20)).replace(year=1984)),
+        ]
+        self.db.add_all([user] + contacts)
+        self.db.commit()
+
+        self.assertEqual([c.first_name for c in upcoming_birthdays(db=self.db, user=user)], ["John"])
+        self.assertEqual([c.first_name for c in upcoming_birthdays(db=self.db, user=user, days=30)], ["John", "Jane"])
+
+    def test_email_queue_delivery_and_retry(self):
+        # Письма из очереди уходят через одно SMTP-соединение, отклоненное письмо повторяется позже
+        templates = Path(__file__).resolve().parents[1] / 'src' / 'services' / 'templates'
+
+        async def scenario():
+            async with LocalSMTPServer() as server:
+                queue = EmailQueue(fakeredis.FakeAsyncRedis())
+                worker = EmailWorker(queue, {"hostname": server.host, "port": server.port, "use_tls": False},
+                                     sender="app@example.com", template_folder=templates, backoff=0)
+                for name in ("john", "jane"):
+                    await queue.enqueue(f"{name}@example.com", "Confirm", "email_template.html",
+                                        {"host": "http://test/", "username": name, "token": "t"})
+                server.reject_next = 1
+                handled = await worker.process_batch(timeout=0.1)
+                retries = await queue.redis.zcard(queue.retry)
+                promoted = await queue.promote_due()
+                await worker.process_batch(timeout=0.1)
+                pending = await queue.redis.llen(queue.processing(worker.worker_id))
+                await worker._disconnect()
+                return server, handled, retries, promoted, pending
+
+        server, handled, retries, promoted, pending = asyncio.run(scenario())
+        self.assertEqual((handled, retries, promoted, pending), (2, 1, 1, 0))
+        self.assertEqual([m["To"] for m in server.messages], ["jane@example.com", "john@example.com"])
+        self.assertEqual(server.connections, 1)
+
+    def test_rate_limiter_sliding_window(self):
+        # Окно общее для всех процессов, а повторные отказы решаются локально без Redis
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis()
+            first, second = RateLimiter(redis), RateLimiter(redis)
+            decisions = [await limiter.hit("contacts:list:1", 3, 60) for limiter in (first, second, first, second)]
+            await redis.flushall()
+            return decisions, await second.hit("contacts:list:1", 3, 60)
+
+        decisions, after_flush = asyncio.run(scenario())
+        self.assertEqual(decisions[:3], [0, 0, 0])
+        self.assertTrue(55 < decisions[3] <= 60)
+        self.assertTrue(55 < after_flush <= 60)
+
+    def test_rate_limiter_circuit_breaker(self):
+        # Пока Redis недоступен, лимитер пропускает запросы по локальному ведру или отказывает с ошибкой
+        class BrokenRedis:
+            calls = 0
+
+            def register_script(self, script):
+                async def run(keys, args):
+                    BrokenRedis.calls += 1
+                    raise ConnectionError("redis is down")
+                return run
+
+        async def scenario():
+            fail_open = RateLimiter(BrokenRedis(), breaker=CircuitBreaker(failure_threshold=2))
+            decisions = [await fail_open.hit("contacts:get:1", 3, 60) for _ in range(4)]
+            fail_closed = RateLimiter(BrokenRedis(), fail_open=False)
+            with self.assertRaises(LimiterUnavailable):
+                await fail_closed.hit("contacts:get:1", 3, 60)
+            return decisions
+
+        decisions = asyncio.run(scenario())
+        self.assertEqual(decisions[:3], [0, 0, 0])
+        self.assertGreater(decisions[3], 0)
+        # после двух ошибок автомат размыкается и третий запрос уже не идет в Redis
+        self.assertEqual(BrokenRedis.calls, 3)
+
+    def test_rate_limiter_cancelled_probe(self):
+        # Отмененная пробная попытка не должна навсегда оставлять автомат разомкнутым
+        class HangingRedis:
+            def register_script(self, script):
+                async def run(keys, args):
+                    await asyncio.Event().wait()
+                return run
+
+        async def scenario():
+            breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+            breaker.failure()
+            limiter = RateLimiter(HangingRedis(), fail_open=False, timeout=10, breaker=breaker)
+            probe = asyncio.create_task(limiter.hit("contacts:get:1", 3, 60))
+            await asyncio.sleep(0)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+            limiter.redis = fakeredis.FakeAsyncRedis()
+            return await limiter.hit("contacts:get:1", 3, 60), breaker.state
+
+        self.assertEqual(asyncio.run(scenario()), (0, "closed"))
+
+    def test_session_store_rotation_and_reuse(self):
+        # У каждого входа своя сессия; повторное использование старого токена закрывает только ее
+        async def scenario():
+            store = SessionStore(fakeredis.FakeAsyncRedis())
+            (phone, phone_jti), (laptop, laptop_jti) = await store.create(60), await store.create(60)
+            rotated, next_jti = await store.rotate(phone, phone_jti, 60)
+            reused, _ = await store.rotate(phone, phone_jti, 60)
+            after_reuse, _ = await store.rotate(phone, next_jti, 60)
+            other, _ = await store.rotate(laptop, laptop_jti, 60)
+            return rotated, reused, after_reuse, other
+
+        self.assertEqual(asyncio.run(scenario()), (ROTATED, REUSED, MISSING, ROTATED))
+
+    def test_response_cache(self):
+        # 304 по ETag, повторный ответ из кеша, запись делает старые ETag и тела недействительными
+        builds = []
+
+        async def build(media_type):
+            builds.append(media_type)
+            return f"page {len(builds)}".encode()
+
+        def request(etag=None):
+            headers = [(b"if-none-match", etag.encode())] if etag else []
+            return Request({"type": "http", "method": "GET", "path": "/api/contacts/", "query_string": b"limit=10",
+                            "headers": headers})
+
+        async def scenario():
+            cache = ResponseCache(ttl=60)
+            cache.redis = fakeredis.FakeAsyncRedis()
+            first = await cache.respond(request(), 1, build)
+            etag = first.headers["etag"]
+            not_modified = await cache.respond(request(etag), 1, build)
+            cached = await cache.respond(request(), 1, build)
+            other_user = await cache.respond(request(), 2, build)
+            await cache.bump(1)
+            after_write = await cache.respond(request(etag), 1, build)
+            return first, not_modified, cached, other_user, after_write
+
+        first, not_modified, cached, other_user, after_write = asyncio.run(scenario())
+        self.assertEqual((first.status_code, first.body), (200, b"page 1"))
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(cached.body, b"page 1")
+        self.assertEqual(other_user.body, b"page 2")
+        self.assertEqual((after_write.status_code, after_write.body), (200, b"page 3"))
+        self.assertNotEqual(after_write.headers["etag"], first.headers["etag"])
+        self.assertEqual(len(builds), 3)
+
+    def test_response_cache_replica_lag(self):
+        # Сразу после записи тело, прочитанное с реплики, не кешируется и не получает ETag новой генерации
+        bodies = iter([b"replica", b"primary", b"replica later"])
+
+        async def build(media_type):
+            return next(bodies)
+
+        def request(replica):
+            scope = {"type": "http", "method": "GET", "path": "/api/contacts/", "query_string": b"", "headers": []}
+            if replica:
+                scope["state"] = {"replica_read": True}
+            return Request(scope)
+
+        async def scenario():
+            cache = ResponseCache(ttl=60, replica_lag=0.05)
+            cache.redis = fakeredis.FakeAsyncRedis()
+            await cache.bump(1)
+            from_replica = await cache.respond(request(True), 1, build)
+            from_primary = await cache.respond(request(False), 1, build)
+            cached_for_replica = await cache.respond(request(True), 1, build)
+            await asyncio.sleep(0.1)
+            await cache.bump(1)
+            await cache.redis.delete(cache._recent_key(1))
+            after_lag = await cache.respond(request(True), 1, build)
+            return from_replica, from_primary, cached_for_replica, after_lag
+
+        from_replica, from_primary, cached_for_replica, after_lag = asyncio.run(scenario())
+        self.assertEqual(from_replica.body, b"replica")
+        self.assertNotIn("etag", from_replica.headers)
+        self.assertEqual(from_primary.body, b"primary")
+        self.assertEqual((cached_for_replica.body, cached_for_replica.headers["etag"]),
+                         (b"primary", from_primary.headers["etag"]))
+        self.assertEqual(after_lag.body, b"replica later")
+        self.assertIn("etag", after_lag.headers)
+
+    def test_response_cache_failed_bump(self):
+        # Пока генерацию не удалось увеличить, старый ETag не дает 304, а кеш не используется
+        class FlakyRedis(fakeredis.FakeAsyncRedis):
+            down = False
+
+            def pipeline(self, *args, **kwargs):
+                pipe = super().pipeline(*args, **kwargs)
+                if FlakyRedis.down:
+                    async def execute(*args, **kwargs):
+                        raise RedisConnectionError("down")
+                    pipe.execute = execute
+                return pipe
+
+        async def build(media_type):
+            return b"page"
+
+        request = lambda headers: Request({"type": "http", "method": "GET", "path": "/api/contacts/",
+                                           "query_string": b"", "headers": headers})
+
+        async def scenario():
+            cache = ResponseCache(ttl=60)
+            cache.redis = FlakyRedis()
+            etag = (await cache.respond(request([]), 1, build)).headers["etag"]
+            FlakyRedis.down = True
+            await cache.bump(1)
+            while_down = await cache.respond(request([(b"if-none-match", etag.encode())]), 1, build)
+            FlakyRedis.down = False
+            recovered = await cache.respond(request([(b"if-none-match", etag.encode())]), 1, build)
+            return while_down, recovered, etag
+
+        while_down, recovered, etag = asyncio.run(scenario())
+        self.assertEqual(while_down.status_code, 200)
+        self.assertNotIn("etag", while_down.headers)
+        self.assertEqual(recovered.status_code, 200)
+        self.assertNotEqual(recovered.headers["etag"], etag)
+
+    def test_health_monitor(self):
+        # Пробы читают результат фоновой проверки; недоступность необязательной зависимости не снимает готовность
+        async def up():
+            pass
+
+        async def down():
+            raise ConnectionError("refused")
+
+        async def hanging():
+            await asyncio.sleep(10)
+
+        async def scenario():
+            monitor = HealthMonitor(interval=0.01, timeout=0.05, required=["database"])
+            monitor.start({"database": up, "redis": down, "smtp": hanging})
+            self.assertFalse(monitor.ready)
+            await asyncio.sleep(0.1)
+            ready, snapshot = monitor.ready, monitor.snapshot()
+            monitor.checks["database"] = down
+            await asyncio.sleep(0.1)
+            after_outage = monitor.ready
+            monitor.checks["database"] = up
+            await asyncio.sleep(0.1)
+            recovered = monitor.ready
+            # проверки остановились: прежний результат устаревает
+            await monitor.stop()
+            monitor.checked_at -= monitor.stale_after + 1
+            return ready, snapshot, after_outage, recovered, monitor.ready
+
+        ready, snapshot, after_outage, recovered, stale = asyncio.run(scenario())
+        self.assertTrue(ready)
+        self.assertEqual({name: check["status"] for name, check in snapshot["checks"].items()},
+                         {"database": "up", "redis": "down", "smtp": "down"})
+        self.assertIn("timed out", snapshot["checks"]["smtp"]["error"])
+        self.assertFalse(after_outage)
+        self.assertTrue(recovered)
+        self.assertFalse(stale)
+
 
 if __name__ == '__main__':
     unittest.main()